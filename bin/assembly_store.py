@@ -0,0 +1,106 @@
+import os, csv, json, hashlib, argparse, subprocess
+from pathlib import Path
+
+# Collects the assemblies of a run without copying them. Every unique assembly is stored once under its sha256 in
+# assembly/store/, the per-assembler view (assembly/{assembler}/) and the assembly/all/ view are links to the stored file
+# (hardlink, otherwise reflink, otherwise symlink). assembly/assembly_index.tsv lists every assembly by sample, assembler and
+# polishing round (0 is the unpolished assembly, 1..N the medaka rounds) and replaces the _collected.txt/medaka_completed.txt files.
+# python /path/to/bin/assembly_store.py --outdir /path/to/output --samples S1 S2 --assemblers flye raven --medaka_samples S1 --rounds 1
+
+INDEX_COLUMNS = ['sample', 'assembler', 'round', 'sha256', 'size', 'store_path', 'source']
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--outdir", metavar="Path", help="Output directory of the run", type=str, required=True)
+    arg.add_argument("--samples", metavar="Name", help="Samples to collect", type=str, nargs='+', required=True)
+    arg.add_argument("--assemblers", metavar="Name", help="Assemblers that were run", type=str, nargs='+', required=True)
+    arg.add_argument("--medaka_samples", metavar="Name", help="Samples that were polished with medaka", type=str, nargs='*', default=[])
+    arg.add_argument("--rounds", metavar="Val", help="Number of medaka rounds", type=int, default=1)
+    arg.add_argument("--gate_dir", metavar="Path", help="Directory with the {sample}.json files of bin/gate_samples.py, only the scheduled assemblers are collected", type=str, required=False)
+    arg.add_argument("--index", metavar="Path", help="Index file to write, default {outdir}/assembly/assembly_index.tsv", type=str, required=False)
+    return arg.parse_args()
+
+def sha256sum(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def link(source, destination):
+    """Make destination point to source without copying, returns how: 'hardlink', 'reflink' or 'symlink'"""
+    Path(os.path.dirname(destination)).mkdir(parents=True, exist_ok=True)
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+        return 'hardlink'
+    except OSError: # other file system or no hardlinks allowed
+        pass
+    if subprocess.run(['cp', '--reflink=always', source, destination], stderr=subprocess.DEVNULL).returncode == 0:
+        return 'reflink'
+    os.symlink(os.path.relpath(source, os.path.dirname(destination)), destination)
+    return 'symlink'
+
+def store(filename, store_dir):
+    """Put the file in the store under its sha256 (once), returns (sha256, stored path)"""
+    checksum = sha256sum(filename)
+    stored = f"{store_dir}/{checksum[:2]}/{checksum}.fasta"
+    if not os.path.isfile(stored):
+        link(os.path.realpath(filename), stored)
+    return checksum, stored
+
+def load_gates(gate_dir, samples):
+    """Scheduled assemblers per sample"""
+    scheduled = {}
+    for sample in samples:
+        with open(f"{gate_dir}/{sample}.json") as f:
+            scheduled[sample] = json.load(f)['assemblers']
+    return scheduled
+
+def find_assemblies(outdir, samples, assemblers, medaka_samples, rounds, scheduled=None):
+    """(sample, assembler, round, path) of the unpolished assemblies and every medaka round that is present"""
+    found = []
+    for sample in samples:
+        for assembler in assemblers:
+            if scheduled is not None and assembler not in scheduled[sample]:
+                continue
+            found.append((sample, assembler, 0, f"{outdir}/{assembler}/{sample}/assembly/assembly.fasta"))
+            if sample not in medaka_samples:
+                continue
+            for polishing_round in range(1, rounds + 1):
+                consensus = f"{outdir}/medaka/{sample}/{assembler}/round{polishing_round}/consensus.fasta"
+                if polishing_round == rounds and not os.path.isfile(consensus):
+                    consensus = f"{outdir}/medaka/{sample}/{assembler}/assembly.fasta"
+                if os.path.isfile(consensus):
+                    found.append((sample, assembler, polishing_round, consensus))
+    return found
+
+def collect(outdir, assemblies, index):
+    store_dir = f"{outdir}/assembly/store"
+    rows = []
+    for sample, assembler, polishing_round, filename in assemblies:
+        checksum, stored = store(filename, store_dir)
+        if polishing_round == 0:
+            link(stored, f"{outdir}/assembly/{assembler}/{sample}_assembly.fasta")
+            link(stored, f"{outdir}/assembly/all/{sample}_{assembler}_assembly.fasta")
+        rows.append({'sample': sample, 'assembler': assembler, 'round': polishing_round, 'sha256': checksum,
+                     'size': os.path.getsize(stored), 'store_path': os.path.relpath(stored, outdir), 'source': os.path.relpath(filename, outdir)})
+    tmp_index = f"{index}.tmp"
+    with open(tmp_index, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=INDEX_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_index, index)
+    return rows
+
+def main():
+    flags = parse_arguments()
+    outdir = os.path.abspath(flags.outdir)
+    index = flags.index if flags.index else f"{outdir}/assembly/assembly_index.tsv"
+    scheduled = load_gates(flags.gate_dir, flags.samples) if flags.gate_dir else None
+    rows = collect(outdir, find_assemblies(outdir, flags.samples, flags.assemblers, flags.medaka_samples, flags.rounds, scheduled), index)
+    print(f"Collected {len(rows)} assemblies, {len(set(row['sha256'] for row in rows))} unique")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import csv, argparse
+import numpy as np
+from pathlib import Path
+from benchmarks import collect_benchmarks, tool_read_bases
+
+# Aggregates the benchmark files of one or more output directories into a table per measurement and a summary per tool
+# (throughput in Mb per CPU second, peak RSS per Mb of input reads, I/O; the assemblers and medaka count the downsampled bases) and flags regressions against a stored baseline summary,
+# e.g. when a conda env update makes NECAT or canu slower.
+# python /path/to/bin/benchmark_report.py --outdirs /path/to/run1 /path/to/run2 --output /path/to/report --baseline /path/to/baseline.csv
+
+ROW_COLUMNS = ['outdir', 'tool', 'assembler', 'sample', 'genome_size', 'read_bases', 'input_bases', 's', 'cpu_time', 'max_rss', 'io_in', 'io_out',
+               'mean_load', 'mb_per_cpu_second', 'rss_mb_per_input_mb', 'io_mb']
+SUMMARY_COLUMNS = ['tool', 'assembler', 'n', 'median_s', 'median_cpu_time', 'median_max_rss', 'median_mb_per_cpu_second', 'median_rss_mb_per_input_mb', 'median_io_mb']
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--outdirs", metavar="Path", help="Output directories of the runs to include", type=str, nargs='+', required=True)
+    arg.add_argument("--output", metavar="Path", help="Directory for benchmark_rows and benchmark_summary", type=str, required=True)
+    arg.add_argument("--format", metavar="Name", help="Format of the table per measurement, csv or parquet (needs pandas and pyarrow)", type=str, choices=['csv', 'parquet'], default='csv')
+    arg.add_argument("--baseline", metavar="Path", help="Summary csv of an earlier report to compare against", type=str, required=False)
+    arg.add_argument("--threshold", metavar="Val", help="Relative change that counts as a regression, default 0.3 (30%%)", type=float, default=0.3)
+    arg.add_argument("--fail_on_regression", help="Exit with code 1 when a regression is found", action="store_true", required=False)
+    return arg.parse_args()
+
+def ratio(numerator, denominator):
+    if numerator is None or not denominator:
+        return None
+    return numerator / denominator
+
+def add_derived(row):
+    row['input_bases'] = tool_read_bases(row['tool'], row['read_bases'], row['genome_size'], row['target_depth'])
+    input_mb = row['input_bases'] / 1e6 if row['input_bases'] else None
+    row['mb_per_cpu_second'] = ratio(input_mb, row['cpu_time'])
+    row['rss_mb_per_input_mb'] = ratio(row['max_rss'], input_mb)
+    row['io_mb'] = row['io_in'] + row['io_out'] if row['io_in'] is not None and row['io_out'] is not None else None
+    return row
+
+def median(rows, column):
+    values = [row[column] for row in rows if row[column] is not None]
+    return float(np.median(values)) if values else None
+
+def summarise(rows):
+    """Medians per tool, medaka and medaka_collect per assembler they polish"""
+    summary = []
+    for tool, assembler in sorted(set((row['tool'], row['assembler'] or '') for row in rows)):
+        tool_rows = [row for row in rows if row['tool'] == tool and (row['assembler'] or '') == assembler]
+        summary.append({'tool': tool, 'assembler': assembler, 'n': len(tool_rows),
+                        'median_s': median(tool_rows, 's'),
+                        'median_cpu_time': median(tool_rows, 'cpu_time'),
+                        'median_max_rss': median(tool_rows, 'max_rss'),
+                        'median_mb_per_cpu_second': median(tool_rows, 'mb_per_cpu_second'),
+                        'median_rss_mb_per_input_mb': median(tool_rows, 'rss_mb_per_input_mb'),
+                        'median_io_mb': median(tool_rows, 'io_mb')})
+    return summary
+
+def read_summary(filename):
+    baseline = {}
+    with open(filename) as f:
+        for row in csv.DictReader(f):
+            baseline[(row['tool'], row['assembler'])] = {column: float(value) if value not in ('', None) else None for column, value in row.items() if column not in ('tool', 'assembler')}
+    return baseline
+
+def find_regressions(summary, baseline, threshold):
+    """Lower throughput or higher memory/runtime per tool than the baseline by more than the threshold"""
+    checks = [('median_mb_per_cpu_second', -1), ('median_s', 1), ('median_rss_mb_per_input_mb', 1)] # -1: lower is worse
+    regressions = []
+    for current in summary:
+        previous = baseline.get((current['tool'], current['assembler']))
+        if not previous:
+            continue
+        for column, direction in checks:
+            if current[column] is None or not previous.get(column):
+                continue
+            change = (current[column] - previous[column]) / previous[column]
+            if change * direction > threshold:
+                name = f"{current['tool']} ({current['assembler']})" if current['assembler'] and current['assembler'] != current['tool'] else current['tool']
+                regressions.append(f"{name}: {column} {previous[column]:.4g} -> {current[column]:.4g} ({change:+.0%})")
+    return regressions
+
+def write_csv(rows, columns, filename):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main():
+    flags = parse_arguments()
+    rows = []
+    for outdir in flags.outdirs:
+        rows.extend(add_derived(row) for row in collect_benchmarks(outdir))
+    if len(rows) == 0:
+        print(f"No benchmark files found in {' '.join(flags.outdirs)}")
+        exit(1)
+    Path(flags.output).mkdir(parents=True, exist_ok=True)
+    if flags.format == 'parquet':
+        import pandas as pd
+        pd.DataFrame(rows, columns=ROW_COLUMNS).to_parquet(f"{flags.output}/benchmark_rows.parquet", index=False)
+    else:
+        write_csv(rows, ROW_COLUMNS, f"{flags.output}/benchmark_rows.csv")
+    summary = summarise(rows)
+    write_csv(summary, SUMMARY_COLUMNS, f"{flags.output}/benchmark_summary.csv")
+    for tool_summary in summary:
+        print(' '.join(f"{column}={tool_summary[column]:.4g}" if isinstance(tool_summary[column], float) else f"{column}={tool_summary[column]}" for column in SUMMARY_COLUMNS))
+    if flags.baseline:
+        regressions = find_regressions(summary, read_summary(flags.baseline), flags.threshold)
+        with open(f"{flags.output}/regressions.txt", 'w') as f:
+            f.write(''.join(f"{regression}\n" for regression in regressions))
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions and flags.fail_on_regression:
+            exit(1)
+
+if __name__ == "__main__":
+    main()
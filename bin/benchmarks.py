@@ -0,0 +1,120 @@
+import os, re, csv, glob, json, yaml
+
+# Reads the Snakemake benchmark files an output directory collects under log/benchmark/ and the per-sample inputs they can be
+# joined with (genome size from the samplesheet, read bases from the NanoStats csv of the filtlong set, input size, target depth).
+# Used by bin/resource_model.py and bin/benchmark_report.py. The per step measurements of bin/step_timer.py under log/steps/
+# are matched to the same tool and sample with collect_steps().
+
+ASSEMBLERS = ['canu', 'flye', 'longcycler', 'miniasm_and_minipolish', 'necat', 'raven', 'redbean']
+RESOURCE_KEYS = {'miniasm_and_minipolish': 'miniasm_polish'} # tool names as used in the threads/mem_mb/max_mb/runtime_min config
+DOWNSAMPLED_TOOLS = set(ASSEMBLERS) | {'miniasm_polish', 'medaka', 'medaka_batch', 'medaka_collect'} # get the reads downsampled to target_depth
+BENCHMARK_COLUMNS = ['s', 'max_rss', 'max_vms', 'max_uss', 'max_pss', 'io_in', 'io_out', 'mean_load', 'cpu_time']
+
+# (regex on the path relative to the output directory, tool), the groups name the sample and, for medaka, the assembler
+BENCHMARK_PATTERNS = [(re.compile(rf"log/benchmark/{assembler}/(?P<sample>.+)_assembly\.txt$"), assembler) for assembler in ASSEMBLERS] + [
+    (re.compile(rf"log/benchmark/medaka/medaka_(?P<assembler>{'|'.join(ASSEMBLERS)})_(?P<sample>.+)\.txt$"), 'medaka'),
+    (re.compile(r"log/benchmark/medaka/medaka_batch_(?P<sample>.+)\.txt$"), 'medaka_batch'),
+    (re.compile(rf"log/benchmark/medaka_collect/(?P<sample>.+)_(?P<assembler>{'|'.join(ASSEMBLERS)})\.txt$"), 'medaka_collect'),
+    (re.compile(r"log/benchmark/filtlong/(?P<sample>.+)\.txt$"), 'filtlong'),
+    (re.compile(r"log/benchmark/genome_size/(?P<sample>.+)\.txt$"), 'estimate_genome_size'),
+    (re.compile(r"log/benchmark/downsample/(?P<sample>.+)\.txt$"), 'downsample'),
+    (re.compile(r"log/benchmark/trycycler_subsets/(?P<sample>.+)\.txt$"), 'trycycler_subsets'),
+    (re.compile(r"log/benchmark/chopper_(?P<sample>.+)\.txt$"), 'chopper'),
+    (re.compile(r"log/nanoplot/nanoplot_(?P<sample>.+)\.txt$"), 'nanoplot'),
+]
+
+def resource_key(tool):
+    return RESOURCE_KEYS.get(tool, tool)
+
+def tool_read_bases(tool, read_bases, genome_size, target_depth):
+    """Read bases that go into the tool, the filtlong bases capped at target_depth x genome_size for the downsampled tools"""
+    if read_bases and genome_size and target_depth and tool in DOWNSAMPLED_TOOLS:
+        return min(read_bases, float(target_depth) * genome_size)
+    return read_bases
+
+def read_benchmark(filename):
+    """Rows of a Snakemake benchmark file as floats (None for NA), there is a row per repeat"""
+    rows = []
+    with open(filename) as f:
+        for row in csv.DictReader(f, delimiter='\t'):
+            values = {}
+            for column in BENCHMARK_COLUMNS:
+                try:
+                    values[column] = float(row.get(column))
+                except (TypeError, ValueError):
+                    values[column] = None
+            rows.append(values)
+    return rows
+
+def read_nanostats_value(filename, description):
+    if not os.path.isfile(filename):
+        return None
+    with open(filename) as f:
+        for row in csv.DictReader(f):
+            if row['Description'] == description:
+                return float(row['Value'])
+    return None
+
+def sample_inputs(outdir):
+    """{sample: {'genome_size', 'read_bases', 'input_bytes', 'target_depth'}} of one output directory"""
+    samplesheet = f"{outdir}/config/longread_samplesheet.yaml"
+    if not os.path.isfile(samplesheet):
+        return {}
+    with open(samplesheet) as file:
+        samples = yaml.load(file, Loader=yaml.FullLoader)['samples']
+    target_depth = 0 # runs from before the downsampling
+    if os.path.isfile(f"{outdir}/config/longread_parameter_config.yaml"):
+        with open(f"{outdir}/config/longread_parameter_config.yaml") as file:
+            target_depth = float(yaml.load(file, Loader=yaml.FullLoader).get('target_depth', 0))
+    inputs = {}
+    for sample, info in samples.items():
+        inputs[sample] = {'genome_size': info.get('genome_size'),
+                          'read_bases': read_nanostats_value(f"{outdir}/nanoplot/gz_filtlong/{sample}/{sample}_NanoStats.csv", 'Total bases'),
+                          'input_bytes': info.get('input_bytes'),
+                          'target_depth': target_depth}
+    return inputs
+
+def collect_benchmarks(outdir):
+    """A row per benchmark measurement in the output directory, joined with the inputs of its sample"""
+    outdir = os.path.abspath(outdir)
+    inputs = sample_inputs(outdir)
+    rows = []
+    for filename in sorted(glob.glob(f"{outdir}/log/**/*.txt", recursive=True)):
+        relative = os.path.relpath(filename, outdir)
+        matched = match_benchmark(relative)
+        if not matched:
+            continue
+        tool, sample, assembler = matched
+        for measurement in read_benchmark(filename):
+            row = {'outdir': outdir, 'tool': tool, 'sample': sample, 'assembler': assembler}
+            row.update(inputs.get(sample, {'genome_size': None, 'read_bases': None, 'input_bytes': None, 'target_depth': 0}))
+            row.update(measurement)
+            rows.append(row)
+    return rows
+
+def match_benchmark(relative):
+    """(tool, sample, assembler) of a path relative to the output directory, None when it is not a known benchmark file"""
+    for pattern, tool in BENCHMARK_PATTERNS:
+        match = pattern.match(relative)
+        if match:
+            assembler = match.groupdict().get('assembler') or (tool if tool in ASSEMBLERS else None)
+            return tool, match.group('sample'), assembler
+    return None
+
+def collect_steps(outdir):
+    """A row per step measurement, log/steps/{x}.jsonl belongs to the benchmark file log/benchmark/{x}.txt (or log/{x}.txt)"""
+    outdir = os.path.abspath(outdir)
+    rows = []
+    for filename in sorted(glob.glob(f"{outdir}/log/steps/**/*.jsonl", recursive=True)):
+        relative = os.path.relpath(filename, f"{outdir}/log/steps")[:-len('.jsonl')]
+        matched = match_benchmark(f"log/benchmark/{relative}.txt") or match_benchmark(f"log/{relative}.txt")
+        if not matched:
+            continue
+        tool, sample, assembler = matched
+        with open(filename) as f:
+            for line in f:
+                if line.strip():
+                    row = {'outdir': outdir, 'tool': tool, 'sample': sample, 'assembler': assembler}
+                    row.update(json.loads(line))
+                    rows.append(row)
+    return rows
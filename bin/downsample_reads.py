@@ -0,0 +1,47 @@
+import argparse, sys
+import numpy as np
+from fastq_io import compression_arguments
+from filter_reads import load_index, copy_selected
+from step_timer import step
+
+# Downsamples the filtlong read set of a sample to a target depth before it goes into the assemblers and medaka, canu and NECAT
+# runtime grows steeply with depth and most isolates are sequenced far deeper than needed. Uses the same two passes as
+# bin/filter_reads.py: the reads are scored on length and mean base accuracy, the best scoring reads are kept until
+# target_depth * genome_size bases are reached and copied in their original order. A sample below the target keeps all reads.
+# python /path/to/bin/downsample_reads.py --input filtlong.fastq.gz --output downsampled.fastq.gz --genome_size 5000000 --target_depth 100
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--input", metavar="Path", help="Read file, can be compressed", type=str, required=True)
+    arg.add_argument("--output", metavar="Path", help="Output read file", type=str, required=True)
+    arg.add_argument("--genome_size", metavar="Val", help="Expected genome size of the sample", type=int, required=True)
+    arg.add_argument("--target_depth", metavar="Val", help="Depth to downsample to, 0 keeps all reads", type=float, default=100)
+    arg.add_argument("--index", metavar="Path", help="Optional .npz file to store the read index in, reused when the input did not change", type=str, required=False)
+    arg.add_argument("--threads", metavar="Val", help="Threads used for compressing the output", type=int, default=1)
+    compression_arguments(arg)
+    arg.add_argument("--steps", metavar="Path", help="Optional JSON lines file for the measurements per step (bin/step_timer.py)", type=str, required=False)
+    return arg.parse_args()
+
+def select_to_depth(lengths, scores, target_bases):
+    """Boolean mask of the best scoring reads that together reach target_bases, all reads when there are not enough bases"""
+    keep = np.ones(len(lengths), dtype=bool)
+    if target_bases <= 0 or lengths.sum(dtype=np.int64) <= target_bases:
+        return keep
+    ranked = np.argsort(scores, kind='stable')[::-1]
+    cumulative = np.cumsum(lengths[ranked], dtype=np.int64)
+    keep[:] = False
+    keep[ranked[:np.searchsorted(cumulative, target_bases) + 1]] = True
+    return keep
+
+def main():
+    flags = parse_arguments()
+    with step(flags.steps, 'score'):
+        offsets, lengths, scores = load_index(flags.input, flags.index)
+    keep = select_to_depth(lengths, scores, flags.target_depth * flags.genome_size)
+    with step(flags.steps, 'select'):
+        copy_selected(flags.input, flags.output, offsets, keep, flags.threads, flags.codec, flags.level)
+    total_bases, kept_bases = int(lengths.sum(dtype=np.int64)), int(lengths[keep].sum(dtype=np.int64))
+    print(f"Kept {int(keep.sum())} of {len(lengths)} reads, depth {kept_bases / flags.genome_size:.1f}x of {total_bases / flags.genome_size:.1f}x", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse, os, sys
+import numpy as np
+from pathlib import Path
+from fastq_io import open_reads, iter_fastq, iter_batches
+
+# Estimates the genome size of a sample from its reads (the chopper output), so samples without a known species don't all get
+# the 5 Mb default of files/species_size.txt for canu, redbean, NECAT, the coverage and min_read_depth. The lookup table value is
+# only used as a prior: it is the result when the reads give no clear k-mer depth peak, and for a known species the estimate is
+# kept within --max_ratio of it.
+# Canonical k-mers are counted in a count-min sketch of --memory_mb, only the k-mers whose hash is divisible by --sampling are
+# counted (like FracMinHash) so the error k-mers of long reads don't fill the sketch. A second pass over the same reads gives the
+# k-mer depth histogram, the genome size is sampling * (solid k-mers / depth of the peak), solid meaning above the first valley.
+# Writes the genome size as a single number, the Snakefile rules read it with $(cat {input.genome_size}).
+# python /path/to/bin/estimate_genome_size.py --input chopper.fastq.gz --prior 5000000 --output genome_size/S1.txt
+
+ENCODE = np.full(256, 4, dtype=np.uint8)
+for base, code in zip(b'ACGTacgt', [0, 1, 2, 3, 0, 1, 2, 3]):
+    ENCODE[base] = code
+HASH_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93], dtype=np.uint64)
+MAX_DEPTH = 10000 # k-mers above this depth (repeats, phages) are counted in the last bin
+MIN_PEAK_DEPTH = 5 # a lower peak can't be told apart from the error k-mers
+SIZE_LIMITS = (100000, 20000000) # estimates outside these are not trusted without a known species
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--input", metavar="Path", help="Read file, can be compressed", type=str, required=True)
+    arg.add_argument("--output", metavar="Path", help="File to write the genome size to", type=str, required=True)
+    arg.add_argument("--prior", metavar="Val", help="Genome size from the species lookup table", type=int, required=True)
+    arg.add_argument("--species", metavar="Name", help="species_full of the sample, 'Not Provided' when unknown", type=str, default="Not Provided")
+    arg.add_argument("--k", metavar="Val", help="k-mer length, at most 31, default 17", type=int, default=17)
+    arg.add_argument("--sampling", metavar="Val", help="Count 1 in this many k-mers (by hash), default 8", type=int, default=8)
+    arg.add_argument("--memory_mb", metavar="Val", help="Memory for the count-min sketch, default 512", type=int, default=512)
+    arg.add_argument("--max_bases", metavar="Val", help="Only use the first reads up to this many bases, default 250000000", type=int, default=250000000)
+    arg.add_argument("--max_ratio", metavar="Val", help="A known species keeps the estimate within this factor of the prior, default 2", type=float, default=2)
+    return arg.parse_args()
+
+def pack_kmers(codes, k):
+    """2-bit value of the k-mer and of its reverse complement at every position, built by doubling the k-mer length
+    so it takes about log2(k) passes over the arrays instead of k"""
+    forward = reverse = None
+    length = 0
+    part, part_reverse, span = codes, np.uint64(3) - codes, 1
+    while True:
+        if k & 1:
+            if forward is None:
+                forward, reverse, length = part, part_reverse, span
+            else:
+                n = len(forward) - span
+                forward = (forward[:n] << np.uint64(2 * span)) | part[length:length + n]
+                reverse = (part_reverse[length:length + n] << np.uint64(2 * length)) | reverse[:n]
+                length += span
+        k >>= 1
+        if not k:
+            return forward, reverse
+        n = len(part) - span
+        part, part_reverse = (part[:n] << np.uint64(2 * span)) | part[span:], (part_reverse[span:] << np.uint64(2 * span)) | part_reverse[:n]
+        span *= 2
+
+def sampled_hashes(seqs, k, sampling):
+    """Hashes of the canonical k-mers of the reads that are kept by the sampling, k-mers with other bases than ACGT are skipped"""
+    codes = ENCODE[np.frombuffer(b'N'.join(seqs), dtype=np.uint8)]
+    n = len(codes) - k + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    invalid = np.concatenate(([0], np.cumsum(codes == 4, dtype=np.int64)))
+    valid = invalid[k:] == invalid[:n]
+    forward, reverse = pack_kmers(np.minimum(codes, 3).astype(np.uint64), k)
+    hashes = np.minimum(forward, reverse)[valid] * HASH_MULTIPLIERS[0]
+    hashes ^= hashes >> np.uint64(31)
+    return hashes[hashes % np.uint64(sampling) == 0]
+
+def sketch_columns(hashes, row, width):
+    return ((hashes * HASH_MULTIPLIERS[row]) >> np.uint64(20)) % np.uint64(width)
+
+def read_batches(path, max_bases):
+    """Sequences in batches, stops after max_bases so both passes see the same reads"""
+    total = 0
+    with open_reads([path], partial=True) as reads: # the decompressor is stopped once max_bases is reached
+        for batch in iter_batches(iter_fastq(reads), 500): # keeps the k-mer arrays of a batch around 50 MB
+            seqs = [record[1] for record in batch]
+            yield seqs
+            total += sum(map(len, seqs))
+            if total >= max_bases:
+                break
+
+def count_kmers(path, k, sampling, memory_mb, max_bases):
+    """k-mer depth histogram, histogram[c] is the number of sampled k-mer occurrences with depth c"""
+    width = max(1024, memory_mb * 1024 * 1024 // (4 * len(HASH_MULTIPLIERS)))
+    sketch = np.zeros((len(HASH_MULTIPLIERS), width), dtype=np.uint32)
+    for seqs in read_batches(path, max_bases):
+        unique, counts = np.unique(sampled_hashes(seqs, k, sampling), return_counts=True)
+        for row in range(len(HASH_MULTIPLIERS)):
+            np.add.at(sketch[row], sketch_columns(unique, row, width), counts.astype(np.uint32))
+    histogram = np.zeros(MAX_DEPTH + 1, dtype=np.float64)
+    for seqs in read_batches(path, max_bases):
+        unique, counts = np.unique(sampled_hashes(seqs, k, sampling), return_counts=True)
+        depth = sketch[0][sketch_columns(unique, 0, width)]
+        for row in range(1, len(HASH_MULTIPLIERS)):
+            depth = np.minimum(depth, sketch[row][sketch_columns(unique, row, width)])
+        histogram += np.bincount(np.minimum(depth, MAX_DEPTH), weights=counts, minlength=MAX_DEPTH + 1)
+    return histogram
+
+def size_from_histogram(histogram, sampling):
+    """(genome size, peak depth), None for the size when there is no usable peak"""
+    distinct = histogram[1:] / np.arange(1, len(histogram)) # k-mers per depth, index 0 is depth 1
+    smooth = np.convolve(distinct, np.ones(3) / 3, mode='valid') # smooth[i] is centred on depth i + 2
+    rising = np.flatnonzero(smooth[1:] > smooth[:-1])
+    if len(rising) == 0:
+        return None, 0
+    valley = int(rising[0]) + 2 # depth with the fewest k-mers between the error k-mers and the genome k-mers
+    peak = valley + int(np.argmax(smooth[valley - 2:]))
+    if peak < MIN_PEAK_DEPTH:
+        return None, peak
+    return int(sampling * histogram[valley:].sum() / peak), peak
+
+def choose_size(estimate, prior, species, max_ratio):
+    """The estimate within the limits the prior allows, the prior when there is no usable estimate"""
+    if estimate is None:
+        return prior, "no k-mer depth peak, using the prior"
+    if species != "Not Provided":
+        chosen = int(min(max(estimate, prior / max_ratio), prior * max_ratio))
+        return chosen, f"estimate {estimate}, {species} prior {prior}"
+    if not SIZE_LIMITS[0] <= estimate <= SIZE_LIMITS[1]:
+        return prior, f"estimate {estimate} outside {SIZE_LIMITS[0]}-{SIZE_LIMITS[1]}, using the prior"
+    return estimate, f"estimate {estimate}, no species known"
+
+def main():
+    flags = parse_arguments()
+    if not 1 <= flags.k <= 31:
+        print(f"k should be between 1 and 31, not {flags.k}", file=sys.stderr)
+        exit(1)
+    estimate, peak = size_from_histogram(count_kmers(flags.input, flags.k, flags.sampling, flags.memory_mb, flags.max_bases), flags.sampling)
+    size, reason = choose_size(estimate, flags.prior, flags.species, flags.max_ratio)
+    Path(os.path.dirname(os.path.abspath(flags.output))).mkdir(parents=True, exist_ok=True)
+    with open(flags.output, 'w') as output:
+        output.write(f"{size}\n")
+    print(f"Genome size {size} (k-mer depth peak {peak}x, {reason})", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
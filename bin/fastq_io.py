@@ -0,0 +1,142 @@
+import os, glob, shlex, shutil, signal, subprocess
+import numpy as np
+from contextlib import contextmanager
+
+# Small streaming helpers shared by the read processing scripts in bin/ (preprocessing, stats, filtering).
+# Decompression and compression are handed to pigz/zstd/bgzip subprocesses so Python only has to parse the records.
+
+# Phred error probability for every possible byte in a quality line (offset 33), lookups are done with numpy.
+ERROR_PROB = np.power(10.0, -np.clip(np.arange(256, dtype=np.float64) - 33, 0, None) / 10)
+
+def input_files(path, irods_mode="False"):
+    """Data from iRODS is a directory with (chunked) fastq files per isolate, otherwise it is a single file"""
+    if irods_mode == "True" or os.path.isdir(path):
+        return sorted(glob.glob(f"{path}/*fastq*"))
+    return [path]
+
+# Intermediate read files follow the compression policy of the parameter config (codec, level, threads), see compression_arguments().
+# The extension only tells gzip (.gz) and zstd (.zst) apart, readers look at the first bytes of every file instead.
+EXTENSIONS = {'gzip': '.fastq.gz', 'pigz': '.fastq.gz', 'bgzip': '.fastq.gz', 'zstd': '.fastq.zst', 'none': '.fastq'}
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+def compression_arguments(arg):
+    arg.add_argument("--codec", metavar="Name", help="Codec for the output, default from the extension (.gz pigz, .zst zstd, otherwise none)", type=str, choices=list(EXTENSIONS), required=False)
+    arg.add_argument("--level", metavar="Val", help="Compression level, default of the codec", type=int, required=False)
+
+def codec_of(path):
+    """Codec used to write path when none is given"""
+    if path.endswith('.zst'):
+        return 'zstd'
+    if path.endswith('.gz'):
+        return 'pigz' if shutil.which('pigz') else 'gzip'
+    return 'none'
+
+def compress_command(codec, level=None, threads=1):
+    if codec == 'pigz' and not shutil.which('pigz'):
+        codec = 'gzip'
+    level_arg = [] if level is None else [f"-{level}"]
+    if codec == 'gzip':
+        return ['gzip', '-c'] + level_arg
+    if codec == 'pigz':
+        return ['pigz', '-c', '-p', str(threads)] + level_arg
+    if codec == 'bgzip':
+        return ['bgzip', '-c', '-@', str(threads)] + ([] if level is None else ['-l', str(level)])
+    if codec == 'zstd':
+        return ['zstd', '-c', '-q', f"-T{threads}"] + level_arg
+    return None
+
+def decompress_command(path):
+    """Command that writes the decompressed file to stdout, based on the first bytes so the extension doesn't matter"""
+    with open(path, 'rb') as handle:
+        magic = handle.read(4)
+    if magic.startswith(ZSTD_MAGIC):
+        return ['zstd', '-dcq', path]
+    if magic.startswith(GZIP_MAGIC): # bgzip output is a multi member gzip, pigz and zcat read it as well
+        return ['pigz', '-dc', path] if shutil.which('pigz') else ['zcat', path]
+    return ['cat', path]
+
+@contextmanager
+def open_reads(paths, partial=False):
+    """Single decompressed stream over all files, gzip (also bgzip), zstd and uncompressed files can be mixed.
+    With partial the caller may stop reading before the end, the decompressor is then terminated instead of read to the end."""
+    commands = [decompress_command(path) for path in paths]
+    if all(command[0] == commands[0][0] for command in commands): # the usual case, one process for all files
+        cmd = commands[0][:-1] + list(paths)
+    else:
+        cmd = ['sh', '-c', ' && '.join(' '.join(shlex.quote(part) for part in command) for command in commands)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=1024 * 1024)
+    try:
+        yield proc.stdout
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    expected = {0}
+    if partial and proc.poll() is None:
+        proc.terminate()
+        expected |= {-signal.SIGTERM, -signal.SIGPIPE}
+    proc.stdout.close()
+    if proc.wait() not in expected:
+        raise RuntimeError(f"Decompressing {' '.join(paths)} failed with exit code {proc.returncode}")
+
+@contextmanager
+def open_writer(path, threads=1, codec=None, level=None):
+    """Write to path, compressed with codec on the given number of threads, the codec follows the extension when not given"""
+    cmd = compress_command(codec or codec_of(path), level, threads)
+    if cmd is None:
+        with open(path, 'wb', buffering=1024 * 1024) as handle:
+            yield handle
+        return
+    with open(path, 'wb') as out:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=out, bufsize=1024 * 1024)
+        try:
+            yield proc.stdin
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        proc.stdin.close()
+        if proc.wait() != 0:
+            raise RuntimeError(f"Compressing {path} failed with exit code {proc.returncode}")
+
+def iter_fastq(handle):
+    """Yields (header, sequence, quality) as bytes without newlines, the '+' line is dropped"""
+    readline = handle.readline
+    while True:
+        header = readline()
+        if not header:
+            return
+        seq = readline().rstrip(b'\r\n')
+        plus = readline()
+        qual = readline().rstrip(b'\r\n')
+        if header[:1] != b'@' or plus[:1] != b'+' or len(seq) != len(qual):
+            raise ValueError(f"Malformed FASTQ record near {header[:60]!r}")
+        yield header.rstrip(b'\r\n'), seq, qual
+
+def iter_batches(records, size=10000):
+    """Group records in lists so the quality calculations can be vectorised"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def mean_qualities(quals):
+    """Mean read quality per quality string, averaged as error probabilities the same way chopper and NanoPlot do"""
+    lengths = np.fromiter(map(len, quals), dtype=np.int64, count=len(quals))
+    result = np.zeros(len(quals), dtype=np.float64)
+    nonempty = lengths > 0
+    if not nonempty.any():
+        return result
+    errors = ERROR_PROB[np.frombuffer(b''.join(quals), dtype=np.uint8)]
+    starts = (np.cumsum(lengths) - lengths)[nonempty] # empty reads add no bytes so these offsets stay strictly increasing
+    mean_error = np.add.reduceat(errors, starts) / lengths[nonempty]
+    result[nonempty] = -10 * np.log10(np.maximum(mean_error, 1e-10))
+    return result
+
+def format_record(header, seq, qual):
+    return b'%s\n%s\n+\n%s\n' % (header, seq, qual)
@@ -0,0 +1,112 @@
+import argparse, os, sys
+import numpy as np
+from pathlib import Path
+from fastq_io import open_reads, open_writer, compression_arguments, mean_qualities
+from step_timer import step
+
+# Keep percent filter for the filtlong rule that works directly on the compressed chopper output, so no uncompressed
+# temp file is needed. The first pass scores every read into a small index (byte offset in the decompressed stream,
+# length and score), the second pass copies the selected records in their original order to the output, compressed following --codec.
+# Reads are scored like filtlong's defaults on length and mean base accuracy, filtlong's window quality is not used.
+# python /path/to/bin/filter_reads.py --input chopper.fastq.gz --output filtlong.fastq.gz --keep_percent 90 --min_length 1000
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--input", metavar="Path", help="Read file, can be compressed", type=str, required=True)
+    arg.add_argument("--output", metavar="Path", help="Output read file", type=str, required=True)
+    arg.add_argument("--keep_percent", metavar="Val", help="Percentage of bases to keep, the best scoring reads are kept", type=float, default=90)
+    arg.add_argument("--min_length", metavar="Val", help="Reads shorter than this are always removed", type=int, default=1000)
+    arg.add_argument("--index", metavar="Path", help="Optional .npz file to store the read index in, reused when the input did not change", type=str, required=False)
+    arg.add_argument("--threads", metavar="Val", help="Threads used for compressing the output", type=int, default=1)
+    compression_arguments(arg)
+    arg.add_argument("--steps", metavar="Path", help="Optional JSON lines file for the measurements per step (bin/step_timer.py)", type=str, required=False)
+    return arg.parse_args()
+
+def input_signature(path):
+    stat = os.stat(path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+def score_reads(lengths, quals):
+    """Geometric mean of the read length and the mean base accuracy in percent"""
+    accuracy = 100 * (1 - np.power(10, -quals / 10))
+    return np.sqrt(lengths * accuracy)
+
+def build_index(path, batch_size=50000):
+    """First pass: byte offset, length and score of every read, the last offset is the end of the stream"""
+    offsets, lengths, scores = [], [], []
+    position = 0
+    with open_reads([path]) as reads:
+        readline = reads.readline
+        while True:
+            batch_offsets, batch_quals = [], []
+            for _ in range(batch_size):
+                header = readline()
+                if not header:
+                    break
+                seq, plus, qual = readline(), readline(), readline()
+                if header[:1] != b'@' or plus[:1] != b'+':
+                    raise ValueError(f"Malformed FASTQ record near {header[:60]!r}")
+                batch_offsets.append(position)
+                position += len(header) + len(seq) + len(plus) + len(qual)
+                batch_quals.append(qual.rstrip(b'\r\n'))
+            if batch_quals:
+                batch_lengths = np.fromiter(map(len, batch_quals), dtype=np.uint32, count=len(batch_quals))
+                offsets.append(np.array(batch_offsets, dtype=np.uint64))
+                lengths.append(batch_lengths)
+                scores.append(score_reads(batch_lengths, mean_qualities(batch_quals)).astype(np.float32))
+            if len(batch_quals) < batch_size:
+                break
+    offsets.append(np.array([position], dtype=np.uint64))
+    return (np.concatenate(offsets), np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.uint32),
+            np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32))
+
+def load_index(path, index_path):
+    if index_path and os.path.isfile(index_path):
+        stored = np.load(index_path)
+        if np.array_equal(stored['signature'], input_signature(path)):
+            print(f"Reusing read index {index_path}", file=sys.stderr)
+            return stored['offsets'], stored['lengths'], stored['scores']
+    offsets, lengths, scores = build_index(path)
+    if index_path:
+        Path(os.path.dirname(os.path.abspath(index_path))).mkdir(parents=True, exist_ok=True)
+        with open(index_path, 'wb') as index_file: # np.savez would add .npz to the name otherwise
+            np.savez(index_file, offsets=offsets, lengths=lengths, scores=scores, signature=input_signature(path))
+    return offsets, lengths, scores
+
+def select_reads(lengths, scores, keep_percent, min_length):
+    """Boolean mask of the best scoring reads that together hold keep_percent of the bases above min_length"""
+    keep = np.zeros(len(lengths), dtype=bool)
+    eligible = np.flatnonzero(lengths >= min_length)
+    if len(eligible) == 0:
+        return keep
+    ranked = eligible[np.argsort(scores[eligible], kind='stable')[::-1]]
+    cumulative = np.cumsum(lengths[ranked], dtype=np.int64)
+    target = cumulative[-1] * keep_percent / 100
+    keep[ranked[:np.searchsorted(cumulative, target) + 1]] = True
+    return keep
+
+def copy_selected(path, output, offsets, keep, threads, codec=None, level=None, chunk=1024 * 1024):
+    """Second pass: copy the byte ranges of the selected records, nothing has to be parsed again"""
+    selected = np.flatnonzero(keep)
+    position = 0
+    with open_reads([path]) as reads, open_writer(output, threads, codec, level) as out:
+        for i in selected:
+            start, end = int(offsets[i]), int(offsets[i + 1])
+            while position < start:
+                position += len(reads.read(min(chunk, start - position)))
+            out.write(reads.read(end - start))
+            position = end
+        while reads.read(chunk): # drain so the decompressor exits cleanly
+            pass
+
+def main():
+    flags = parse_arguments()
+    with step(flags.steps, 'score'):
+        offsets, lengths, scores = load_index(flags.input, flags.index)
+    keep = select_reads(lengths, scores, flags.keep_percent, flags.min_length)
+    with step(flags.steps, 'select'):
+        copy_selected(flags.input, flags.output, offsets, keep, flags.threads, flags.codec, flags.level)
+    print(f"Kept {int(keep.sum())} of {len(lengths)} reads, {int(lengths[keep].sum(dtype=np.int64))} of {int(lengths.sum(dtype=np.int64))} bases", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse, csv, json, os, sys
+from pathlib import Path
+from edit_nanoplot_longread import parse_nanostats
+
+# Decides per sample which assemblers (and so which medaka jobs and Trycycler subsets) are scheduled, based on the NanoStats of the
+# filtlong read set. Samples without reads (e.g. the no_file_found.fastq.gz placeholder), with a read N50 below min_read_n50 or a
+# coverage below the minimum of an assembler don't get those jobs. The gate checkpoint of the Snakefile writes {OUT}/gate/{sample}.json,
+# the gate_report rule combines them in {OUT}/gate/skip_report.tsv.
+# python /path/to/bin/gate_samples.py --sample S1 --nanostats nanoplot/gz_filtlong/S1/NanoStats.txt --genome_size 5000000 --assemblers flye canu --min_coverage default=10 canu=20 --min_read_n50 1000 --output gate/S1.json
+# python /path/to/bin/gate_samples.py --report gate/skip_report.tsv --gates gate/S1.json gate/S2.json
+
+REPORT_COLUMNS = ['sample', 'reads', 'coverage', 'read_n50', 'scheduled', 'skipped', 'reason']
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--sample", metavar="Name", help="Sample to decide on", type=str, required=False)
+    arg.add_argument("--nanostats", metavar="Path", help="NanoStats.txt of the filtlong read set", type=str, required=False)
+    arg.add_argument("--genome_size", metavar="Val", help="Expected genome size of the sample", type=int, required=False)
+    arg.add_argument("--assemblers", metavar="Name", help="Assemblers in subset_used", type=str, nargs='*', default=[])
+    arg.add_argument("--min_coverage", metavar="Name=Val", help="Minimum coverage per assembler (or trycycler), 'default' for the others", type=str, nargs='*', default=[])
+    arg.add_argument("--min_read_n50", metavar="Val", help="Minimum read N50, below it nothing is assembled", type=float, default=0)
+    arg.add_argument("--output", metavar="Path", help="JSON file with the decision", type=str, required=False)
+    arg.add_argument("--report", metavar="Path", help="Write the skip report of all --gates files instead", type=str, required=False)
+    arg.add_argument("--gates", metavar="Path", help="JSON files written by this script", type=str, nargs='*', default=[])
+    return arg.parse_args()
+
+def parse_minimums(pairs):
+    """['default=10', 'canu=20'] to {'default': 10.0, 'canu': 20.0}"""
+    minimums = {'default': 0.0}
+    for pair in pairs:
+        name, value = pair.split('=', 1)
+        minimums[name] = float(value)
+    return minimums
+
+def decide(sample, stats, genome_size, assemblers, minimums, min_read_n50):
+    reads = int(stats['general'].get('Number of reads', 0))
+    coverage = stats['general'].get('Total bases', 0) / genome_size
+    read_n50 = stats['general'].get('Read length N50', 0)
+    decision = {'sample': sample, 'reads': reads, 'coverage': round(coverage, 2), 'read_n50': read_n50,
+                'assemblers': [], 'skipped': {}, 'trycycler': False}
+    if reads == 0:
+        reason = 'no reads'
+    elif read_n50 < min_read_n50:
+        reason = f"read N50 {read_n50:.0f} < {min_read_n50:.0f}"
+    else:
+        reason = None
+    for name in assemblers + ['trycycler']:
+        minimum = minimums.get(name, minimums['default'])
+        if reason:
+            decision['skipped'][name] = reason
+        elif coverage < minimum:
+            decision['skipped'][name] = f"coverage {coverage:.1f}x < {minimum:.0f}x"
+        elif name == 'trycycler':
+            decision['trycycler'] = True
+        else:
+            decision['assemblers'].append(name)
+    return decision
+
+def write_report(gates, filename):
+    Path(os.path.dirname(os.path.abspath(filename))).mkdir(parents=True, exist_ok=True)
+    with open(filename, 'w', newline='') as report:
+        writer = csv.DictWriter(report, fieldnames=REPORT_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        for gate in gates:
+            with open(gate) as f:
+                decision = json.load(f)
+            writer.writerow({'sample': decision['sample'], 'reads': decision['reads'], 'coverage': decision['coverage'],
+                             'read_n50': decision['read_n50'], 'scheduled': ','.join(decision['assemblers']),
+                             'skipped': ','.join(decision['skipped']), 'reason': '; '.join(sorted(set(decision['skipped'].values())))})
+
+def main():
+    flags = parse_arguments()
+    if flags.report:
+        write_report(flags.gates, flags.report)
+        return
+    if not (flags.sample and flags.nanostats and flags.genome_size and flags.output):
+        print("Supply --sample, --nanostats, --genome_size and --output, or --report with --gates", file=sys.stderr)
+        exit(1)
+    decision = decide(flags.sample, parse_nanostats(flags.nanostats), flags.genome_size, flags.assemblers,
+                      parse_minimums(flags.min_coverage), flags.min_read_n50)
+    Path(os.path.dirname(os.path.abspath(flags.output))).mkdir(parents=True, exist_ok=True)
+    with open(flags.output, 'w') as f:
+        json.dump(decision, f, indent=1)
+    for name, reason in decision['skipped'].items():
+        print(f"Skipping {name} for {flags.sample}: {reason}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
-import os.path, glob, os, json, yaml, pymssql, traceback, argparse, shutil, requests, re, csv, textwrap, subprocess
+import os.path, os, io, json, yaml, argparse, shutil, re, csv, textwrap
 from termcolor import colored
 from datetime import datetime
 from pathlib import Path
 from sys import exit
+from species_size import load_species_index, get_size
+from input_inventory import build_inventory
+import isolate_metadata
+from resource_model import fit_model, save_model, predict, estimate_read_bases
+from thread_budget import DEFAULT_THREADS, scale_threads, validate_snakefile
+from fastq_io import EXTENSIONS
+from preflight_reads import preflight, inventory_files
+from samplesheet_state import sample_hashes, merge_samplesheet, classify, load_hashes, write_if_changed
+
+GATE_MIN_COVERAGE = {'canu': 20, 'necat': 20} # assemblers that need more coverage than --min_coverage, see bin/gate_samples.py
 
 def getmylogo(pth):
     exec_globals = {}
@@ -78,6 +88,16 @@ def parse_arguments(logo):
         default='90',
         required=False,
     )
+    arg.add_argument(
+        "--target_depth",
+        metavar="Val",
+        help="Depth the filtered reads are downsampled to before assembly, 0 to use all reads, default 100",
+        type=str,
+        nargs='?',
+        const='100',
+        default='100',
+        required=False,
+    )
     arg.add_argument(
         "--trycycler",
         help="Supply if you want to run trycycler",
@@ -113,6 +133,109 @@ def parse_arguments(logo):
         type=str,
         required=False,
     )
+    arg.add_argument(
+        "--medaka_batch",
+        help="Polish all assemblies of a sample in a single medaka job instead of one job per assembler",
+        action="store_true",
+        required=False,
+    )
+    arg.add_argument(
+        "--group_jobs",
+        help="Run the preprocessing rules of a sample as a single cluster job",
+        action="store_true",
+        required=False,
+    )
+    arg.add_argument(
+        "--total_cores",
+        metavar="Val",
+        help="Cores of the machine or cluster node, the threads of every tool are scaled proportionally to this",
+        type=int,
+        required=False,
+    )
+    arg.add_argument(
+        "--no_genome_size_estimate",
+        help="Use the genome size of the species lookup table instead of estimating it from the reads",
+        action="store_true",
+        required=False,
+    )
+    arg.add_argument(
+        "--min_coverage",
+        metavar="Val",
+        help="Samples with a lower coverage after filtering are not assembled, default 10",
+        type=float,
+        default=10,
+        required=False,
+    )
+    arg.add_argument(
+        "--min_read_n50",
+        metavar="Val",
+        help="Samples with a lower read N50 after filtering are not assembled, default 1000",
+        type=float,
+        default=1000,
+        required=False,
+    )
+    arg.add_argument(
+        "--compression",
+        metavar="Name",
+        help="Codec of the intermediate read files: gzip, pigz, bgzip, zstd or none, default pigz",
+        type=str,
+        choices=list(EXTENSIONS),
+        default='pigz',
+        required=False,
+    )
+    arg.add_argument(
+        "--compression_level",
+        metavar="Val",
+        help="Compression level of the intermediate read files, default of the codec",
+        type=int,
+        required=False,
+    )
+    arg.add_argument(
+        "--compression_threads",
+        metavar="Val",
+        help="Threads for compressing the intermediate read files, default the threads of chopper",
+        type=int,
+        required=False,
+    )
+    arg.add_argument(
+        "--scratch_dir",
+        metavar="Path",
+        help="Directory for the intermediate read files instead of the output directory, e.g. a fast scratch disk with --compression none. It has to be shared by all cluster nodes and the submitting host, a node-local disk does not work",
+        type=str,
+        required=False,
+    )
+    arg.add_argument(
+        "--resource_history",
+        metavar="Path",
+        help="Output directories of previous runs, their benchmarks are used to predict mem_mb and runtime_min per sample",
+        type=str,
+        nargs='+',
+        required=False,
+    )
+    arg.add_argument(
+        "--preflight",
+        help="Check every input read file (decompression and FASTQ records) before the samplesheet is made, see bin/preflight_reads.py",
+        action="store_true",
+        required=False,
+    )
+    arg.add_argument(
+        "--keep_bad_inputs",
+        help="With --preflight, flag samples with a corrupt input file in the samplesheet instead of leaving them out",
+        action="store_true",
+        required=False,
+    )
+    arg.add_argument(
+        "--incremental",
+        help="Merge new samples into the existing samplesheet and only rewrite the config files when their content changes",
+        action="store_true",
+        required=False,
+    )
+    arg.add_argument(
+        "--rescan",
+        help="Scan the input directories again instead of using config/input_inventory.json from a previous run",
+        action="store_true",
+        required=False,
+    )
     return arg.parse_args()
 
 def determine_outdir():
@@ -148,37 +271,59 @@ def get_usercfg():
 ## Deletes samplesheet if already exists For now only generate config.yaml when it's not present. ##
 ####################################################################################################
 
+def write_config(filename, text, name):
+    """Write a config file to the output and the Snakemake directory, with --incremental only the files whose content changed"""
+    for path in [filename, f"{origin_dir}/{config}/{name}"]:
+        if flags.incremental:
+            if write_if_changed(path, text):
+                print(f"{path} updated")
+            continue
+        if os.path.isfile(path) == True:
+            os.remove(path)
+            if path == filename:
+                print(f"{name} was already present - deleting previous file and making an new one")
+        with open(path, 'w') as config_open:
+            config_open.write(text)
+
 def generate_parameter(filename):
-    """Create parameter yaml file"""
-    if os.path.isfile(filename) == True:
-        os.remove(filename)
-        print(f"{parameter_yaml_str} was already present - deleting previous file and making an new one")
-    with open(filename, 'a') as parameter_open:
+    """Create parameter yaml file, returns the parameters"""
+    with io.StringIO() as parameter_open:
         parameter_open.write("# Single program parameters." + '\n')
+        threads = scale_threads(DEFAULT_THREADS, flags.total_cores)
         config_yaml = {}
         config_yaml = dict({'workdir' : OUT,
                             'keep_percent' : flags.keep_percent,
                             'keep_percent_str' : flags.keep_percent.split('.')[0],
+                            'target_depth' : flags.target_depth, # Also NECAT's PREP_OUTPUT_COVERAGE and redbean's -X, up to 40 and 50
+                            'read_cache': 'True', # hardcoded now but could become a flag, the reads for the assemblers are kept uncompressed
+                            'read_cache_dir': f"{OUT}/tmp/read_cache", # Must be reachable from every cluster node
                             'medaka_model' : flags.medaka_model,
                             'medaka_rounds' : flags.medaka_rounds,
+                            'medaka_batch': 'True' if flags.medaka_batch else 'False', # one medaka_batch job per sample instead of the medaka_* rules
                             'length': '1000', # hardcoded now but could become a flag
                             'headcrop': '80', # hardcoded now but could become a flag
-                            'tailcrop': '80' # hardcoded now but could become a flag
+                            'tailcrop': '80', # hardcoded now but could become a flag
+                            'filtlong_min_length': '1000', # hardcoded now but could become a flag
+                            'nanoplot_plots': 'False', # NanoPlot is only needed for the plots, the stats are calculated by bin/read_stats.py
+                            'group_jobs': 'True' if flags.group_jobs else 'False',
+                            'genome_size_estimate': {'enabled': 'False' if flags.no_genome_size_estimate else 'True', # bin/estimate_genome_size.py, the lookup table is the prior
+                                                     'k': 17,
+                                                     'sampling': 8,
+                                                     'memory_mb': 512,
+                                                     'max_bases': 250000000,
+                                                     'max_ratio': 2},
+                            'gate': {'min_coverage': dict({'default': flags.min_coverage}, **{name: max(flags.min_coverage, value) for name, value in GATE_MIN_COVERAGE.items()}),
+                                     'min_read_n50': flags.min_read_n50},
+                            'compression': {'codec': flags.compression, # policy for the chopper and filtlong read files, see bin/fastq_io.py
+                                            'level': flags.compression_level,
+                                            'threads': flags.compression_threads or threads['chopper'],
+                                            'extension': EXTENSIONS[flags.compression],
+                                            'directory': os.path.abspath(flags.scratch_dir) if flags.scratch_dir else OUT}
                             })
         yaml.dump(config_yaml, parameter_open)
         parameter_open.write('\n' + "# Number of threads, mem_mb and wait (minutes)." + '\n')
         threads_mem_yaml = {}
-        threads_mem_yaml['threads'] = dict({'default' : 1,
-                                            'canu' : 4,
-                                            'flye': 4,
-                                            'kraken2':4,
-                                            'medaka': 8,
-                                            'miniasm_polish': 4, 
-                                            'necat': 4, 
-                                            'pycoqc': 1,
-                                            'raven': 4,
-                                            'redbean': 2,
-                                            'longcycler': 8})
+        threads_mem_yaml['threads'] = threads # Used by the rules, NECAT's config and canu's maxThreads
         threads_mem_yaml['max_mb'] = dict({'default' : 5000,
                                             'canu' : 60000,
                                             'flye': 20000,
@@ -212,73 +357,40 @@ def generate_parameter(filename):
                                             'pycoqc': 45,
                                             'raven': 600,
                                             'redbean': 600,
-                                            'longcycler': 600})
+                                            'longcycler': 600,
+                                            # Rules of the preprocess group, with --group_jobs Snakemake combines them for the group job
+                                            'chopper': 30,
+                                            'estimate_genome_size': 30,
+                                            'filtlong': 30,
+                                            'nanoplot': 30,
+                                            'downsample': 30,
+                                            'trycycler_subsets': 30})
         yaml.dump(threads_mem_yaml, parameter_open)
+        write_config(filename, parameter_open.getvalue(), parameter_yaml_str)
+    return {**config_yaml, **threads_mem_yaml}
 
-    if os.path.isfile(f"{origin_dir}/{config}/{parameter_yaml_str}") == True: # If a current Snakemake parameter config exists delete it
-        os.remove(f"{origin_dir}/{config}/{parameter_yaml_str}")
-    shutil.copyfile(filename, f"{origin_dir}/{config}/{parameter_yaml_str}")
-
-def ExtractFromSQLServer(key,cfg):
-    # Search the CPE database for certain fields (which can differ from MRSA so made into separate functions)
-    db = {'1':"db_name_1",'2':"db_name_2"}[key[0]]
-    fields = {'1':"[SPECIES_FIELD],[PUBKEY_FIELD]",'2':"[SPECIES_FIELD],[PUBKEY_FIELD]"}[key[0]]
-    connection = None
+def lookup_isolate_metadata(keys, cfg):
+    """Species and publication key of all isolates with one query per database, empty without a user config to reach the databases"""
+    if not cfg:
+        return {}
+    if 'sqlite' in cfg: # Directory with a .sqlite file per database instead of the SQL Server
+        lookup = isolate_metadata.connect_sqlite(cfg['sqlite'])
+    else:
+        lookup = isolate_metadata.connect_sqlserver(cfg)
     try:
-        connection = pymssql.connect(server=cfg['server'], database=db, user=cfg['user'], password=cfg['password'], as_dict=True)
-        with connection.cursor() as cursor:
-            cursor.execute(f"SELECT {fields} FROM [TABLE] WHERE [KEY] = '{key}'")
-            if cursor.rowcount == 0:
-                print("No Data")
-            else:
-                DATA = cursor.fetchall()
-                DATA = [x for x in DATA]
-                return DATA
-    except Exception as e:
-        emsg = traceback.format_exc()
-        print(emsg, 'Exception from testSQLServerConnection')		
+        return lookup.lookup(keys)
     finally:
-        if not connection == None:
-            connection.close()
-
-def determine_single(fullname_dict):
-    func_single_name_dict = {}
-    func_single_name_count_dict = {}
-    for v in fullname_dict:
-        single = v.split(' ')[0]
-        genomesize = fullname_dict[v]
-        if single in func_single_name_dict:
-            func_single_name_dict[single] = int((((func_single_name_dict[single] * func_single_name_count_dict[single]) + genomesize) / (func_single_name_count_dict[single]+1)))
-            func_single_name_count_dict[single] += 1
-        else: 
-            func_single_name_dict[single] = genomesize
-            func_single_name_count_dict[single] = 1
-    return func_single_name_dict
+        lookup.close()
 
 def filter_longread(all_files): # Should probably not allow .fasta because filtlong/trycycler won't allow it
     # https://docs.python.org/3/library/re.html / https://regex101.com/
     pattern = '^[a-zA-Z0-9_.\-\#]*(.fastq.gz|.fasta.gz|.fasta|.fa|.fsa|.fastq)+$'
     longreads = []
-    for file in all_files:
-        if os.path.isfile(file):
-            query = os.path.basename(file)
-            if re.match(pattern, query):
-                longreads.append(file)
-            else:
-                pass
+    for file in all_files: # Entries of the input inventory, these are files only so no need to check
+        if re.match(pattern, file['name']):
+            longreads.append(file['path'])
     return longreads
 
-def get_size(species_name, full_dict):
-    func_size = 5000000 # default value
-    if species_name in full_dict:
-        func_size = full_dict[species_name]
-    else:
-        func_single_size = determine_single(full_dict)
-        single_specie = species_name.split(' ')[0]
-        if single_specie in func_single_size:
-            func_size = func_single_size[single_specie]
-    return func_size
-
 def determine_assemblers(ac_file):
     to_use = []
     with open(ac_file, 'r') as file:
@@ -349,52 +461,88 @@ def define_subsets():
         specific_yaml = specific_sub(determine_assemblers(f"{os.path.abspath(origin_dir)}/files/assembler_choice.csv"))
         return specific_yaml
 
-def GetLongReadInputDir(path_to_barcode_dirs): 
-    barcode_dirs = sorted(glob.glob(f"{os.path.abspath(path_to_barcode_dirs)}/barcode*"))
+def GetLongReadInputDir(inventory): 
     dict_nanopore_input_dir = {} # Directory with barcode only, used for input rule in Snakemake
-    for single_dir in barcode_dirs:
-        barcode = single_dir.split('/')[-1]
-        if len(glob.glob(f"{single_dir}/*")) == 0:
+    for barcode, barcode_info in inventory['barcodes'].items():
+        if len(barcode_info['files']) == 0:
             # I need to make sure this will then also be exluded from running when no longread is found, however I don't think this will or should happen often.
-            fullpath_headfile = f"{single_dir}/no_file_found.fastq.gz"
-            directory = os.path.dirname(fullpath_headfile)
-            dict_nanopore_input_dir[barcode] = directory
+            fullpath_headfile = f"{barcode_info['path']}/no_file_found.fastq.gz"
         else:
-            fullpath_headfile = glob.glob(f"{single_dir}/*")[0]
-            directory = os.path.dirname(fullpath_headfile)
-            dict_nanopore_input_dir[barcode] = directory
+            fullpath_headfile = barcode_info['files'][0]['path']
+        dict_nanopore_input_dir[barcode] = os.path.dirname(fullpath_headfile)
     return dict_nanopore_input_dir
 
+def determine_input_root():
+    """Directory that holds the input, the longread dir or the basecalled dir with barcode directories for iRODS mode"""
+    if flags.longread:
+        return os.path.abspath(flags.longread)
+    basecalled_dir = '' if flags.basecalled_dir.split('_')[-1] == 'NOSUBDIR' else flags.basecalled_dir
+    if flags.input:
+        return os.path.abspath(f"{os.path.abspath(flags.input)}/{basecalled_dir}")
+    return os.path.abspath(f"{os.path.abspath(OUT)}/{basecalled_dir}")
+
+def determine_input_bytes(run_barcode_key, barcode):
+    """Size of the raw input of a sample, the file itself or all files in the barcode directory for iRODS mode"""
+    if flags.longread:
+        return sum(file['size'] for file in inventory['files'] if file['path'] == run_barcode_key)
+    if barcode in inventory['barcodes']:
+        return sum(file['size'] for file in inventory['barcodes'][barcode]['files'])
+    return 0
+
+def sample_files(run_barcode_key, barcode):
+    """Paths of the raw input files of a sample, like determine_input_bytes()"""
+    if flags.longread:
+        return [run_barcode_key]
+    if barcode in inventory['barcodes']:
+        return [file['path'] for file in inventory['barcodes'][barcode]['files']]
+    return []
+
+def preflight_status(paths):
+    """(status, reads, bases) of the input of a sample from the preflight manifest, None without --preflight"""
+    entries = [preflight_manifest[path] for path in paths if path in preflight_manifest]
+    if not entries:
+        return None
+    statuses = [entry['status'] for entry in entries]
+    status = 'corrupt' if 'corrupt' in statuses else 'empty' if all(s == 'empty' for s in statuses) else 'ok'
+    if any(entry['bases'] is None for entry in entries):
+        return status, None, None
+    return status, sum(entry['reads'] for entry in entries), sum(entry['bases'] for entry in entries)
+
+def determine_sample_names(run_barcode_key):
+    """Sample name, isolate key and barcode from a longread file name or a Run_Bar_Key"""
+    if flags.longread:
+        searchstring = os.path.basename(run_barcode_key)
+        pattern = '^PR[0-9]{4}_barcode[0-9]{2}_[0-9]{8}[_-]?[a-zA-Z0-9_.-]*(.fastq|.fastq.gz)+$'
+        # pattern = '^R[0-9]{4}_barcode[0-9]{2}_[0-9]{8}[a-zA-Z0-9_.-]+$'
+        if re.fullmatch(pattern, searchstring, flags=re.M): # If supplying a longread flag, check if these files have the file notation as expected so that type-ned key on 2nd index split on '_'
+            sample = '_'.join(((searchstring).split('.')[0]).split('_')[:3])
+            key = sample.split('_')[2]
+            barcode = sample.split('_')[1]
+        else:
+            sample = os.path.basename(run_barcode_key).split('.')[0]
+            key = sample.split('_')[0]
+            barcode = 'barcode00'
+    else:
+        sample = run_barcode_key
+        key = run_barcode_key.split('_')[2]
+        barcode = run_barcode_key.split('_')[1]
+    return sample, key, barcode
+
 def generate_samplesheet_samples(run_barcode_keys, seqsum_filename, cfg):
     samplesheet_yaml = {}
     samplesheet_yaml['samples'] = {}
     samplesheet_yaml['subset_used'] = define_subsets()
     samplesheet_yaml['sequencing_summary'] = {}
     samplesheet_yaml['sequencing_summary'] = f"{OUT}/irods_files/{seqsum_filename}"
+    barcode_available = list(inventory['barcodes'])
+    barcode_input_dirs = GetLongReadInputDir(inventory)
+    metadata = lookup_isolate_metadata([determine_sample_names(run_barcode_key)[1] for run_barcode_key in run_barcode_keys], cfg)
     for x in range(len(run_barcode_keys)): # ExtractFromBarcodeFilename(barcode_directories)[5] is ordered
-        # Could get this part below in a seprate small function to determine the run_bar_key or otherwise sample names.
-        if flags.longread:
-            searchstring = os.path.basename(run_barcode_keys[x])
-            pattern = '^PR[0-9]{4}_barcode[0-9]{2}_[0-9]{8}[_-]?[a-zA-Z0-9_.-]*(.fastq|.fastq.gz)+$'
-            # pattern = '^R[0-9]{4}_barcode[0-9]{2}_[0-9]{8}[a-zA-Z0-9_.-]+$'
-            if re.fullmatch(pattern, searchstring, flags=re.M): # If supplying a longread flag, check if these files have the file notation as expected so that type-ned key on 2nd index split on '_'
-                sample = '_'.join(((searchstring).split('.')[0]).split('_')[:3])
-                key = sample.split('_')[2]
-                barcode = sample.split('_')[1]
-            else:
-                sample = os.path.basename(run_barcode_keys[x]).split('.')[0]
-                key = sample.split('_')[0]
-                barcode = 'barcode00'
-        else:
-            sample = run_barcode_keys[x]
-            key = run_barcode_keys[x].split('_')[2]
-            barcode = run_barcode_keys[x].split('_')[1]
-        basecalled_dir = '' if flags.basecalled_dir.split('_')[-1] == 'NOSUBDIR' else flags.basecalled_dir
-        if flags.input:
-            barcode_directories = f"{os.path.abspath(flags.input)}/{basecalled_dir}"
-        else:
-            barcode_directories = f"{os.path.abspath(OUT)}/{basecalled_dir}"
-        barcode_available = [os.path.basename(path) for path in sorted(glob.glob(f"{os.path.abspath(barcode_directories)}/barcode*"))]
+        sample, key, barcode = determine_sample_names(run_barcode_keys[x])
+        checked = preflight_status(sample_files(run_barcode_keys[x], barcode)) if preflight_manifest else None
+        if checked and checked[0] == 'corrupt' and not flags.keep_bad_inputs:
+            print(colored(f"Leaving out {sample}, an input file is corrupt (see config/preflight_manifest.json)", 'red'))
+            continue
         # if barcode not in barcode_available:
         #     pass
         # else:
@@ -413,18 +561,35 @@ def generate_samplesheet_samples(run_barcode_keys, seqsum_filename, cfg):
             # samplesheet_yaml['samples'][sample]["filtlong_input"] = f"{os.path.dirname(run_barcode_keys[x])}/{sample}"
         else:
             samplesheet_yaml['samples'][sample]["iRODS_mode"] = "True"
-            samplesheet_yaml['samples'][sample]["filtlong_input"] = GetLongReadInputDir(barcode_directories)[barcode]
-            samplesheet_yaml['samples'][sample]["nanopore_input"] = GetLongReadInputDir(barcode_directories)[barcode]
-        # If the functions below returns 'No data' I should fill it with a default value else it will break here
-        # if str(key).startswith('220') or str(key).startswith('290') or str(key).startswith('270') == True:
-        #     samplesheet_yaml['samples'][sample]['species_full'] = ExtractFromSQLServer(key,cfg)[0]['ISOLATE_TL_SPECIES']
-        #     samplesheet_yaml['samples'][sample]['publication_key'] = ExtractFromSQLServer(key,cfg)[0]['RIVM_PUBLIC_KEY']
-        # elif str(key).startswith('110') or str(key).startswith('190') or str(key).startswith('111') == True:
-        #     samplesheet_yaml['samples'][sample]['species_full'] = "Staphylococcus aureus"
-        #     samplesheet_yaml['samples'][sample]['publication_key'] = ExtractFromSQLServer(key,cfg)[0]['RIVM_PUBLIC_KEY']
+            samplesheet_yaml['samples'][sample]["filtlong_input"] = barcode_input_dirs[barcode]
+            samplesheet_yaml['samples'][sample]["nanopore_input"] = barcode_input_dirs[barcode]
+        # Keys that were not found in the databases (or no database access at all) get the default values
         samplesheet_yaml['samples'][sample]['species_full'] = "Not Provided"
         samplesheet_yaml['samples'][sample]['publication_key'] = f"{key}"
-        samplesheet_yaml['samples'][sample]['genome_size'] = get_size(samplesheet_yaml['samples'][sample]['species_full'], species_full_size_dict)
+        if key in metadata and str(key).startswith(('220', '290', '270')):
+            samplesheet_yaml['samples'][sample]['species_full'] = metadata[key][isolate_metadata.SPECIES_FIELD]
+            samplesheet_yaml['samples'][sample]['publication_key'] = metadata[key][isolate_metadata.PUBKEY_FIELD]
+        elif key in metadata and str(key).startswith(('110', '190', '111')):
+            samplesheet_yaml['samples'][sample]['species_full'] = "Staphylococcus aureus"
+            samplesheet_yaml['samples'][sample]['publication_key'] = metadata[key][isolate_metadata.PUBKEY_FIELD]
+        samplesheet_yaml['samples'][sample]['genome_size'] = get_size(samplesheet_yaml['samples'][sample]['species_full'], species_index)
+        samplesheet_yaml['samples'][sample]['input_bytes'] = determine_input_bytes(run_barcode_keys[x], barcode)
+        if checked:
+            samplesheet_yaml['samples'][sample]['input_status'] = checked[0]
+            if checked[0] != 'ok':
+                print(colored(f"Input of {sample} is {checked[0]}", 'yellow'))
+            if checked[2] is not None:
+                samplesheet_yaml['samples'][sample]['input_reads'] = checked[1]
+                samplesheet_yaml['samples'][sample]['input_bases'] = checked[2]
+        if resource_model: # Without a history the static values of the parameter config are used by the Snakefile
+            if checked and checked[2] is not None: # the model is fitted on the bases after filtlong, which keeps keep_percent of them
+                read_bases = checked[2] * float(flags.keep_percent) / 100
+            else:
+                read_bases = estimate_read_bases(resource_model, samplesheet_yaml['samples'][sample]['input_bytes'])
+            # predict() caps read_bases at target_depth x genome_size for the assemblers and medaka, like the fitted feature
+            predicted = predict(resource_model, read_bases, samplesheet_yaml['samples'][sample]['genome_size'], float(flags.target_depth))
+            if predicted:
+                samplesheet_yaml['samples'][sample]['resources'] = predicted
 
     samplesheet_yaml['medaka_model_ss'] = {}
     samplesheet_yaml['medaka_model_ss'] = flags.medaka_model
@@ -433,19 +598,17 @@ def generate_samplesheet_samples(run_barcode_keys, seqsum_filename, cfg):
 
     return samplesheet_yaml
 
-def iget_files(irodspath):
-    if irodspath:
-        print(f"Downloading {irodspath}...", end=' ')
-        SUB_CMD = f"iget -rvf {irodspath} {OUT}/irods_files/"
-        SUB = subprocess.Popen(SUB_CMD, shell=True, stdout=subprocess.PIPE)
-        SUB.communicate()
+def iget_files(irodspaths, staging):
+    # Downloads in parallel over the session of the run, files that are already present with the right checksum are skipped
+    irodspaths = [irodspath for irodspath in irodspaths if irodspath]
+    if irodspaths:
+        print(f"Downloading {' '.join(irodspaths)}...", end=' ')
+        staging.download(irodspaths, f"{OUT}/irods_files/")
         print('...download completed!')
-    else:
-        pass
 
 def determine_runbarkey():
     if flags.longread:
-        runbarkey_list = filter_longread(sorted(glob.glob(f"{os.path.abspath(flags.longread)}/*")))
+        runbarkey_list = filter_longread(inventory['files'])
     else:
         if flags.nanoporedir: # Will be the case with input and alt_input flags
             nanopore_basename_dir = os.path.abspath(flags.nanoporedir) # This is without the 4 digits added by iRODS.
@@ -462,6 +625,26 @@ def backup_samplesheet():
     os.remove(filename_samplesheet_yaml)
     print(f"config/samplesheet was already present - made an backup in the web but starting fresh :)")
 
+def update_samplesheet(generated, parameters):
+    """--incremental: merge into the existing samplesheet, report the delta per sample and only write what changed"""
+    hashes_file = f"{os.path.abspath(OUT)}/{config}/samplesheet_hashes.json"
+    old_hashes = load_hashes(hashes_file)
+    new_hashes = sample_hashes(generated['samples'], inventory, parameters)
+    existing_text = None
+    if os.path.isfile(filename_samplesheet_yaml):
+        with open(filename_samplesheet_yaml) as samplesheet_open:
+            existing_text = samplesheet_open.read()
+        generated = merge_samplesheet(yaml.load(existing_text, Loader=yaml.FullLoader), generated)
+    delta = classify(old_hashes, new_hashes, generated['samples'])
+    for status in ['new', 'changed', 'unchanged', 'kept']:
+        print(f"{len(delta[status])} {status} sample(s){': ' + ' '.join(delta[status]) if delta[status] and status != 'unchanged' else ''}")
+    text = yaml.dump(generated)
+    if existing_text is not None and existing_text != text:
+        backup_samplesheet()
+    write_config(filename_samplesheet_yaml, text, samplesheet_yaml_str)
+    write_if_changed(hashes_file, json.dumps({**{sample: old_hashes[sample] for sample in delta['kept'] if sample in old_hashes}, **new_hashes}, indent=1, sort_keys=True))
+    write_if_changed(f"{os.path.abspath(OUT)}/{config}/samplesheet_delta.json", json.dumps(delta, indent=1))
+
 def main():
     # TEXT
     global config; config = 'config'
@@ -479,19 +662,35 @@ def main():
     Path(f"{os.path.abspath(OUT)}/irods_files").mkdir(parents=True, exist_ok=True)
 
     # FILES / DATA
-    species_data = read_txt(f"{os.path.abspath(origin_dir)}/files/species_size.txt")
-    global species_full_size_dict; species_full_size_dict = json.loads(species_data)
+    global species_index; species_index = load_species_index(f"{os.path.abspath(origin_dir)}/files/species_size.txt")
     global configyml; configyml = get_usercfg()
-    # html_output = irods_functions.irods_for_html_report(flags.nanoporedir)
-    # sequence_sum_output = irods_functions.irods_for_sequence_sum(flags.nanoporedir)
-    # iget_files(html_output[1]); iget_files(sequence_sum_output[1])
+    global resource_model; resource_model = None
+    if flags.resource_history:
+        resource_model = fit_model(flags.resource_history)
+        save_model(resource_model, f"{os.path.abspath(OUT)}/{config}/resource_model.json")
+    global inventory; inventory = build_inventory(determine_input_root(), f"{os.path.abspath(OUT)}/{config}/input_inventory.json", flags.rescan)
+    global preflight_manifest; preflight_manifest = {}
+    if flags.preflight:
+        preflight_manifest = preflight(inventory_files(inventory), f"{os.path.abspath(OUT)}/{config}/preflight_manifest.json", flags.total_cores)
+    # with IrodsStaging() as staging:
+    #     html_output, sequence_sum_output = staging.query_many([lambda session: irods_functions.irods_for_html_report(flags.nanoporedir, session),
+    #                                                            lambda session: irods_functions.irods_for_sequence_sum(flags.nanoporedir, session)])
+    #     iget_files([html_output[1], sequence_sum_output[1]], staging)
 
     # DO STUFF
-    generate_parameter(f"{OUT}/{config}/{parameter_yaml_str}")
+    parameters = generate_parameter(f"{OUT}/{config}/{parameter_yaml_str}")
+    thread_problems = validate_snakefile(f"{origin_dir}/Snakefile", scale_threads(DEFAULT_THREADS, flags.total_cores), flags.total_cores)
+    if thread_problems:
+        print("Rules in the Snakefile do not keep to the threads reserved for them:")
+        print('\n'.join(thread_problems))
+        exit(1)
+    to_dump = generate_samplesheet_samples(determine_runbarkey(),'no_sequencing_summary.html',configyml)
+    if flags.incremental:
+        update_samplesheet(to_dump, parameters)
+        return
     if os.path.isfile(filename_samplesheet_yaml) == True:
         backup_samplesheet()
     with open(filename_samplesheet_yaml, 'a') as samplesheet_open:
-        to_dump = generate_samplesheet_samples(determine_runbarkey(),'no_sequencing_summary.html',configyml)
         yaml.dump(to_dump, samplesheet_open)
     try: 
         shutil.copyfile(filename_samplesheet_yaml, f"{origin_dir}/{config}/{samplesheet_yaml_str}")
@@ -0,0 +1,68 @@
+import os, json
+
+# One scan of the input directory (basecalled dir with barcode* subdirectories, or the --longread dir with a file per isolate)
+# that is reused for everything the samplesheet generator needs to know about the input files.
+# The inventory is saved as a manifest, a rerun reuses it as long as the modification times of the scanned directories did not
+# change (a directory mtime changes when files are added or removed). Every listed file is still stat'ed on reuse, a file that was
+# overwritten or truncated in place gets its current size and mtime, so the preflight manifest, the samplesheet hashes and the
+# input_bytes never see stale values.
+
+def scan_files(path):
+    """Files directly inside path with size and mtime, sorted on name like sorted(glob.glob())"""
+    files = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                stat = entry.stat()
+                files.append({'name': entry.name, 'path': entry.path, 'size': stat.st_size, 'mtime': stat.st_mtime})
+    return sorted(files, key=lambda f: f['path'])
+
+def scan(root):
+    root = os.path.abspath(root)
+    inventory = {'root': root, 'mtime': os.stat(root).st_mtime, 'files': [], 'barcodes': {}}
+    with os.scandir(root) as entries:
+        subdirs = sorted([entry.path for entry in entries if entry.is_dir() and entry.name.startswith('barcode')])
+    for single_dir in subdirs:
+        inventory['barcodes'][os.path.basename(single_dir)] = {'path': single_dir, 'mtime': os.stat(single_dir).st_mtime, 'files': scan_files(single_dir)}
+    inventory['files'] = scan_files(root)
+    return inventory
+
+def is_current(inventory, root):
+    """Only the directories are checked, that is a stat per barcode instead of a listing of thousands of chunk files"""
+    try:
+        if inventory['root'] != os.path.abspath(root) or os.stat(root).st_mtime != inventory['mtime']:
+            return False
+        return all(os.stat(info['path']).st_mtime == info['mtime'] for info in inventory['barcodes'].values())
+    except (OSError, KeyError):
+        return False
+
+def refresh_files(inventory):
+    """Update the size and mtime of every listed file in place, returns the number of changed files, None when a file is gone"""
+    changed = 0
+    for files in [inventory['files']] + [info['files'] for info in inventory['barcodes'].values()]:
+        for file in files:
+            try:
+                stat = os.stat(file['path'])
+            except OSError:
+                return None
+            if stat.st_size != file['size'] or stat.st_mtime != file['mtime']:
+                file['size'], file['mtime'] = stat.st_size, stat.st_mtime
+                changed += 1
+    return changed
+
+def build_inventory(root, manifest=None, rescan=False):
+    if manifest and not rescan and os.path.isfile(manifest):
+        with open(manifest) as f:
+            inventory = json.load(f)
+        changed = refresh_files(inventory) if is_current(inventory, root) else None
+        if changed is not None:
+            print(f"Using input inventory {manifest}" + (f", {changed} file(s) changed in place" if changed else ""))
+            if changed:
+                with open(manifest, 'w') as f:
+                    json.dump(inventory, f)
+            return inventory
+    inventory = scan(root)
+    if manifest:
+        with open(manifest, 'w') as f:
+            json.dump(inventory, f)
+    return inventory
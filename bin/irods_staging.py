@@ -0,0 +1,104 @@
+import os, base64, hashlib, shutil
+from concurrent.futures import ThreadPoolExecutor
+
+# Staging of iRODS data before Snakemake starts. One iRODS session is opened per run and shared by the queries and the downloads,
+# data objects are downloaded concurrently with a bounded pool of workers. Objects whose local copy already has the right checksum
+# are skipped and partial downloads (.part files) are resumed instead of started over.
+# Anything with the iRODSSession interface that is used here (query, data_objects.get/exists/open, collections.get().walk())
+# can be passed as session, which is how this can be tried without an iRODS server.
+
+CHUNK = 8 * 1024 * 1024
+
+def default_session():
+    from irods.session import iRODSSession
+    try:
+        env_file = os.environ['IRODS_ENVIRONMENT_FILE']
+    except KeyError:
+        env_file = os.path.expanduser('~/.irods/irods_environment.json')
+    return iRODSSession(irods_env_file=env_file)
+
+def local_checksum(filename, irods_checksum):
+    """Checksum of the local file in the same notation as iRODS, 'sha2:<base64>' for sha256 otherwise md5 hex"""
+    digest = hashlib.sha256() if irods_checksum.startswith('sha2:') else hashlib.md5()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK), b''):
+            digest.update(block)
+    if irods_checksum.startswith('sha2:'):
+        return f"sha2:{base64.b64encode(digest.digest()).decode()}"
+    return digest.hexdigest()
+
+class IrodsStaging:
+    def __init__(self, session=None, workers=4):
+        self._session = session
+        self._own_session = session is None
+        self.workers = workers
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = default_session()
+        return self._session
+
+    def close(self):
+        if self._own_session and self._session is not None:
+            self._session.cleanup()
+            self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def query_many(self, queries):
+        """Run several query functions (each called with the shared session) at the same time, results in the same order"""
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(lambda query: query(self.session), queries))
+
+    def data_objects(self, irods_path):
+        """(data object, relative local path) pairs, a collection is downloaded with its own name like iget -r does"""
+        if self.session.data_objects.exists(irods_path):
+            data_object = self.session.data_objects.get(irods_path)
+            return [(data_object, data_object.name)]
+        parent = os.path.dirname(irods_path.rstrip('/'))
+        found = []
+        for collection, subcollections, objects in self.session.collections.get(irods_path).walk():
+            for data_object in objects:
+                found.append((data_object, os.path.relpath(data_object.path, parent)))
+        return found
+
+    def irods_checksum(self, data_object):
+        checksum = getattr(data_object, 'checksum', None)
+        if not checksum:
+            checksum = data_object.chksum() # let the server calculate it when it is not registered yet
+        return checksum
+
+    def fetch(self, data_object, local_path):
+        """Download a single data object, returns 'skipped' or 'downloaded'"""
+        checksum = self.irods_checksum(data_object)
+        if os.path.isfile(local_path) and os.path.getsize(local_path) == data_object.size and local_checksum(local_path, checksum) == checksum:
+            return 'skipped'
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        part_file = f"{local_path}.part"
+        for attempt in range(2):
+            offset = os.path.getsize(part_file) if os.path.isfile(part_file) else 0
+            if offset > data_object.size:
+                offset = 0
+            with self.session.data_objects.open(data_object.path, 'r') as remote, open(part_file, 'ab' if offset else 'wb') as local:
+                remote.seek(offset)
+                shutil.copyfileobj(remote, local, CHUNK)
+            if local_checksum(part_file, checksum) == checksum:
+                os.replace(part_file, local_path)
+                return 'downloaded'
+            os.remove(part_file) # a corrupt partial file can not be resumed, try once more from scratch
+        raise IOError(f"Checksum of {data_object.path} does not match after downloading")
+
+    def download(self, irods_paths, destination):
+        """Download collections and data objects to destination, returns {local path: 'skipped'/'downloaded'}"""
+        jobs = []
+        for irods_path in irods_paths:
+            for data_object, relative_path in self.data_objects(irods_path):
+                jobs.append((data_object, os.path.join(destination, relative_path)))
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = pool.map(lambda job: self.fetch(*job), jobs)
+            return {local_path: result for (data_object, local_path), result in zip(jobs, results)}
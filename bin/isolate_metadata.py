@@ -0,0 +1,73 @@
+import sqlite3, traceback
+
+# Species and publication key of all isolates of a run from the SQL Server databases in one go. Keys are grouped on the
+# database they belong to (first digit of the key) and every database gets one parameterised query over a single connection
+# that is reused for later lookups. Results are kept for the rest of the run.
+# Outside RIVM (or for testing) a SQLite file per database with the same table and columns can be used, see connect_sqlite().
+
+DATABASES = {'1': "db_name_1", '2': "db_name_2"}
+TABLE = "TABLE"
+KEY_FIELD = "KEY"
+SPECIES_FIELD = "SPECIES_FIELD"
+PUBKEY_FIELD = "PUBKEY_FIELD"
+FIELDS = {'1': [SPECIES_FIELD, PUBKEY_FIELD], '2': [SPECIES_FIELD, PUBKEY_FIELD]}
+MAX_PARAMETERS = 1000 # SQL Server allows 2100 parameters per query
+
+class IsolateMetadata:
+    def __init__(self, connect, placeholder='%s'):
+        """connect(database) returns a DB-API connection, placeholder is the parameter style of that driver"""
+        self.connect = connect
+        self.placeholder = placeholder
+        self.connections = {}
+        self.cache = {}
+
+    def connection(self, database):
+        if database not in self.connections:
+            self.connections[database] = self.connect(database)
+        return self.connections[database]
+
+    def query(self, prefix, keys):
+        columns = ','.join(f"[{field}]" for field in [KEY_FIELD] + FIELDS[prefix])
+        found = {}
+        cursor = self.connection(DATABASES[prefix]).cursor()
+        try:
+            for start in range(0, len(keys), MAX_PARAMETERS):
+                chunk = keys[start:start + MAX_PARAMETERS]
+                cursor.execute(f"SELECT {columns} FROM [{TABLE}] WHERE [{KEY_FIELD}] IN ({','.join([self.placeholder] * len(chunk))})", tuple(chunk))
+                names = [column[0] for column in cursor.description]
+                for row in cursor.fetchall():
+                    row = dict(row) if isinstance(row, dict) else dict(zip(names, row))
+                    found[str(row[KEY_FIELD])] = row
+        finally:
+            cursor.close()
+        return found
+
+    def lookup(self, keys):
+        """{key: {field: value}} for every key that was found, keys are only queried once per run"""
+        keys = [str(key) for key in keys]
+        groups = {}
+        for key in dict.fromkeys(keys):
+            if key not in self.cache and key[:1] in DATABASES:
+                groups.setdefault(key[0], []).append(key)
+        for prefix, group in groups.items():
+            try:
+                found = self.query(prefix, group)
+            except Exception:
+                print(traceback.format_exc(), f'Exception from SQL lookup in {DATABASES[prefix]}')
+                continue # not cached so a later lookup will try again
+            for key in group:
+                self.cache[key] = found.get(key)
+        return {key: self.cache[key] for key in keys if self.cache.get(key)}
+
+    def close(self):
+        for connection in self.connections.values():
+            connection.close()
+        self.connections = {}
+
+def connect_sqlserver(cfg):
+    import pymssql
+    return IsolateMetadata(lambda database: pymssql.connect(server=cfg['server'], database=database, user=cfg['user'], password=cfg['password'], as_dict=True), '%s')
+
+def connect_sqlite(directory):
+    """Stand-in for SQL Server, every database is a {directory}/{database}.sqlite file"""
+    return IsolateMetadata(lambda database: sqlite3.connect(f"{directory}/{database}.sqlite"), '?')
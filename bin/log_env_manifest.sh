@@ -0,0 +1,35 @@
+#!/usr/bin/env bash
+
+# Logs which program versions a job used without running conda list for every job.
+# The package list of a conda environment is written once per environment to the manifest directory, named after the hash
+# Snakemake gives the environment (the last part of $CONDA_PREFIX), every job only logs a reference to that manifest.
+
+# It takes two positional arguments:
+#  1) the log file of the job
+#  2) the directory with the manifests, e.g. {OUT}/log/env_manifests
+
+log="$1"
+manifest_dir="$2"
+
+echo $'\n====================================\n==     PROGRAM VERSIONS USED      ==\n====================================\n' >> "$log"
+
+if [ -z "$CONDA_PREFIX" ]
+then
+    echo "No conda environment" >> "$log"
+    exit 0
+fi
+
+manifest="$manifest_dir/$(basename "$CONDA_PREFIX").txt"
+if [ ! -s "$manifest" ]
+then
+    mkdir -p "$manifest_dir"
+    # Jobs that start at the same time may both write it, the move makes sure nobody reads a half written manifest.
+    if ! conda list -p "$CONDA_PREFIX" > "$manifest.$$.tmp" 2>> "$log"
+    then
+        rm -f "$manifest.$$.tmp"
+        echo "Could not list the packages of conda environment $CONDA_PREFIX" >> "$log"
+        exit 0
+    fi
+    mv -f "$manifest.$$.tmp" "$manifest"
+fi
+echo "Conda environment $CONDA_PREFIX, package versions in $manifest" >> "$log"
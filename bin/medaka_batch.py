@@ -0,0 +1,77 @@
+import argparse, csv, os, shutil, subprocess, sys, tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from assembly_store import link
+from step_timer import run_command
+
+# Polishes all assemblies of a sample through the medaka rounds in a single job (medaka_batch in the parameter config), instead of one
+# medaka_* job per assembler that each reserve the full medaka threads and memory. The read set is made ready once (decompressed to the
+# job's temp directory when it is compressed) and shared by all assemblers, --parallel assemblers are polished side by side with the
+# threads divided over them. Writes the same {outdir}/{assembler}/round{n}/consensus.fasta and {outdir}/{assembler}/assembly.fasta as the
+# medaka_* rules, the medaka output of every assembler goes to {log_dir}/medaka_{assembler}_{sample}.log and the rounds to --steps.
+# python /path/to/bin/medaka_batch.py --sample S1 --reads reads.fastq --assemblers flye raven --assemblies flye/S1/assembly/assembly.fasta raven/S1/assembly/assembly.fasta --outdir medaka/S1 --rounds 2 --model r1041_e82_400bps_sup_v4.3.0 --threads 8 --parallel 2 --log_dir log/medaka --steps log/steps/medaka/medaka_batch_S1.jsonl --index medaka/S1/batch_index.tsv
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--sample", metavar="Name", help="Sample the assemblies belong to", type=str, required=True)
+    arg.add_argument("--reads", metavar="Path", help="Read set of the sample, can be compressed", type=str, required=True)
+    arg.add_argument("--assemblers", metavar="Name", help="Assemblers, in the same order as --assemblies", type=str, nargs='+', required=True)
+    arg.add_argument("--assemblies", metavar="Path", help="Unpolished assembly of every assembler", type=str, nargs='+', required=True)
+    arg.add_argument("--outdir", metavar="Path", help="medaka/{sample} directory, one subdirectory per assembler", type=str, required=True)
+    arg.add_argument("--rounds", metavar="Val", help="Number of medaka rounds", type=int, default=1)
+    arg.add_argument("--model", metavar="Name", help="Medaka model", type=str, required=True)
+    arg.add_argument("--threads", metavar="Val", help="Threads of the job, divided over the assemblers that run side by side", type=int, default=1)
+    arg.add_argument("--parallel", metavar="Val", help="Assemblers polished side by side, default threads // 4", type=int, required=False)
+    arg.add_argument("--log_dir", metavar="Path", help="Directory for the medaka log of every assembler", type=str, required=True)
+    arg.add_argument("--steps", metavar="Path", help="JSON lines file for the measurement of every round (bin/step_timer.py)", type=str, required=True)
+    arg.add_argument("--index", metavar="Path", help="Tab separated file with the polished assembly of every assembler, written last", type=str, required=True)
+    return arg.parse_args()
+
+def prepare_reads(reads, tmpdir):
+    """Decompress the read set once for all assemblers and rounds, uncompressed read sets (the read cache) are used as they are"""
+    with open(reads, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    if not compressed:
+        return reads
+    prepared = f"{tmpdir}/{os.path.basename(reads)[:-3]}"
+    with open(prepared, 'wb') as out:
+        subprocess.run(['pigz' if shutil.which('pigz') else 'gzip', '-dc', reads], stdout=out, check=True)
+    return prepared
+
+def polish(sample, assembler, assembly, reads, outdir, rounds, model, threads, log_dir, steps):
+    """All medaka rounds of one assembly, returns the final consensus"""
+    input_assembly = assembly
+    with open(f"{log_dir}/medaka_{assembler}_{sample}.log", 'a') as log:
+        for polishing_round in range(1, rounds + 1):
+            round_dir = f"{outdir}/{assembler}/round{polishing_round}"
+            command = ['medaka_consensus', '-i', reads, '-d', input_assembly, '-o', round_dir, '-t', str(threads), '-m', model]
+            if run_command(steps, f"{assembler}_round{polishing_round}", command, stderr=log) != 0:
+                raise RuntimeError(f"medaka_consensus failed for {assembler} of {sample} in round {polishing_round}, see {log.name}")
+            input_assembly = f"{round_dir}/consensus.fasta"
+    link(input_assembly, f"{outdir}/{assembler}/assembly.fasta")
+    return input_assembly
+
+def main():
+    flags = parse_arguments()
+    if len(flags.assemblers) != len(flags.assemblies):
+        print("Supply one --assemblies file for every --assemblers name", file=sys.stderr)
+        exit(1)
+    parallel = max(1, min(flags.parallel or flags.threads // 4, len(flags.assemblers)))
+    threads = max(1, flags.threads // parallel)
+    Path(flags.log_dir).mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=os.environ.get('TMPDIR')) as tmpdir:
+        reads = prepare_reads(flags.reads, tmpdir)
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            jobs = {assembler: pool.submit(polish, flags.sample, assembler, assembly, reads, flags.outdir, flags.rounds, flags.model,
+                                           threads, flags.log_dir, flags.steps)
+                    for assembler, assembly in zip(flags.assemblers, flags.assemblies)}
+            polished = {assembler: job.result() for assembler, job in jobs.items()}
+    with open(flags.index, 'w', newline='') as index:
+        writer = csv.writer(index, delimiter='\t')
+        writer.writerow(['assembler', 'rounds', 'consensus'])
+        for assembler, consensus in polished.items():
+            writer.writerow([assembler, flags.rounds, consensus])
+    print(f"Polished {len(polished)} assemblies of {flags.sample}, {parallel} side by side with {threads} threads each", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
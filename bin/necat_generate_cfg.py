@@ -58,6 +58,8 @@ if "subset_used" in yaml_list and "necat" not in yaml_list["subset_used"]:
 necat_cfg_list= ["assembly"]
 samplelist = [sample for sample in yaml_list['samples']]
 keep_percent = f"{yaml_param_list['keep_percent_str']}"
+target_depth = f"{yaml_param_list['target_depth']}"
+necat_coverage = f"{min(float(target_depth), 40):g}" if target_depth != '0' else 40 # at most the old fixed 40, downsampling should never give NECAT more reads
 
 ################################
 ## template necat config file ##
@@ -70,7 +72,10 @@ for sample in samplelist:
 
     for necatper in necat_cfg_list:
         if necatper == 'assembly':
-            necat_read_name = f"{OUT}/gz/filtlong/{sample}_min1000_best{keep_percent}.fastq.gz"
+            if yaml_param_list['read_cache'] == 'True':
+                necat_read_name = f"{yaml_param_list['read_cache_dir']}/{sample}_{target_depth}x.fastq"
+            else:
+                necat_read_name = f"{OUT}/gz/downsample/{sample}_{target_depth}x.fastq.gz"
         else:
             necat_read_name = f"{OUT}/gz/trycycler_subsets/{sample}/{necatper}.fastq"
         directory_to_make = f"{OUT}/necat/{sample}/{necatper}"
@@ -89,9 +94,9 @@ for sample in samplelist:
         necat_individual_cfg_file_open.write(f"PROJECT=assembly" + '\n'
         + f"ONT_READ_LIST={necat_read_file}" + '\n'
         + f"GENOME_SIZE={genome_size}" + '\n'
-        + f"THREADS=16" + '\n'
+        + f"THREADS={yaml_param_list['threads']['necat']}" + '\n'
         + f"MIN_READ_LENGTH=3000" + '\n'
-        + f"PREP_OUTPUT_COVERAGE=40" + '\n'
+        + f"PREP_OUTPUT_COVERAGE={necat_coverage}" + '\n'
         + f"OVLP_FAST_OPTIONS=-n 500 -z 20 -b 2000 -e 0.5 -j 0 -u 1 -a 1000" + '\n'
         + f"OVLP_SENSITIVE_OPTIONS=-n 500 -z 10 -e 0.5 -j 0 -u 1 -a 1000" + '\n'
         + f"CNS_FAST_OPTIONS=-a 2000 -x 4 -y 12 -l 1000 -e 0.5 -p 0.8 -u 0" + '\n'
@@ -0,0 +1,101 @@
+import os, json, time, argparse, requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Client for the ngsruns REST API (run and barcode information per flowcell). A single HTTP session is reused for all calls,
+# failed calls are retried with backoff and the answers are cached on disk per flowcell ID, so regenerating a samplesheet or an
+# unlock-and-rerun does not query the service again. The server is configurable to test against a local HTTP server.
+# Warm the cache for several runs at once:
+# python /path/to/bin/ngsruns_client.py --cache_dir /path/to/cache FLOWCELL1 FLOWCELL2
+
+SERVER = "http://rivm-biofl-l01p.rivm.ssc-campus.nl"
+CERT = '/etc/pki/ca-trust/extracted/pem/tls-ca-bundle.pem'
+CACHE_DIR = os.environ.get('NGSRUNS_CACHE', os.path.expanduser('~/.cache/ngsruns'))
+
+class NgsRunsClient:
+    def __init__(self, server=SERVER, cache_dir=CACHE_DIR, ttl=24 * 3600, retries=3, backoff=0.5, timeout=30):
+        self.server = server.rstrip('/')
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.verify = CERT if os.path.isfile(CERT) else True
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=16)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def rest_call(self, path):
+        response = self.session.get(f"{self.server}/ngsruns/api/{path}", timeout=self.timeout)
+        if response.status_code != 200:
+            return False
+        try:
+            return response.json()
+        except ValueError:
+            raise Exception(f"url '{response.url}' gives no json data")
+
+    def cache_file(self, flowcell):
+        return f"{self.cache_dir}/{flowcell}.json"
+
+    def read_cache(self, flowcell):
+        if not self.cache_dir or not os.path.isfile(self.cache_file(flowcell)):
+            return None
+        with open(self.cache_file(flowcell)) as f:
+            cached = json.load(f)
+        if time.time() - cached['time'] > self.ttl:
+            return None
+        return cached
+
+    def write_cache(self, flowcell, runinfo):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = f"{self.cache_file(flowcell)}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(runinfo, f)
+        os.replace(tmp_file, self.cache_file(flowcell))
+
+    def run_info(self, flowcell, refresh=False):
+        """{'run': ..., 'barcodes': [...]} for the flowcell, False when the service has no (complete) answer"""
+        cached = None if refresh else self.read_cache(flowcell)
+        if cached:
+            return cached
+        run = self.rest_call(f"runs/{flowcell}")
+        if not run:
+            return False
+        barcodes = self.rest_call(f"runs/{flowcell}/barcodes")
+        if not barcodes:
+            return False
+        runinfo = {'time': time.time(), 'run': run, 'barcodes': barcodes}
+        self.write_cache(flowcell, runinfo)
+        return runinfo
+
+    def run_bar_keys(self, flowcell):
+        """Isolate keys and Run_Bar_Keys ({run name}_{barcode}_{key}) of the flowcell, False when unknown"""
+        runinfo = self.run_info(flowcell)
+        if not runinfo:
+            return False
+        run_prefix = runinfo['run']["name"]
+        list_isolate_key = [item["sampleid"] for item in runinfo['barcodes']]
+        run_bar_key_list = [f"{run_prefix}_{item['barcode']}_{item['sampleid']}" for item in runinfo['barcodes']]
+        return list_isolate_key, run_bar_key_list
+
+    def prefetch(self, flowcells, workers=4):
+        """Fetch several flowcells at once, for assembling multiple runs together"""
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(flowcells, pool.map(self.run_info, flowcells)))
+
+def main():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("flowcells", metavar="ID", help="Flowcell IDs to fetch", type=str, nargs='+')
+    arg.add_argument("--server", metavar="URL", help="ngsruns server", type=str, default=SERVER)
+    arg.add_argument("--cache_dir", metavar="Path", help="Directory for the cached answers", type=str, default=CACHE_DIR)
+    arg.add_argument("--workers", metavar="Val", help="Number of flowcells fetched at the same time", type=int, default=4)
+    flags = arg.parse_args()
+    client = NgsRunsClient(flags.server, flags.cache_dir)
+    for flowcell, runinfo in client.prefetch(flags.flowcells, flags.workers).items():
+        print(f"{flowcell}: {'cached' if runinfo else 'not found'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse, os, json, sys
+from concurrent.futures import ProcessPoolExecutor
+from fastq_io import open_reads, iter_fastq
+from input_inventory import build_inventory
+
+# Checks every input read file before anything is submitted: the file has to decompress completely (a truncated gzip fails) and
+# every record has to be a valid FASTQ record, reads and bases are counted on the way. The files are checked side by side in a
+# process pool, largest first, so runs with many multi-GB files keep all local cores busy. The results are kept in a manifest
+# per file (size, mtime, status, reads, bases, error), files that did not change since the last check are not read again.
+# bin/generate_longread_samplesheet.py --preflight runs this on its input inventory, drops (or with --keep_bad_inputs flags) the
+# samples with a corrupt file and uses the base counts for the resource prediction.
+# python /path/to/bin/preflight_reads.py --input /path/to/longread_dir --manifest /path/to/output/config/preflight_manifest.json --cores 24
+
+FASTQ_SUFFIXES = ('.fastq', '.fastq.gz', '.fq', '.fq.gz')
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--input", metavar="Path", help="Longread directory, or basecalled directory with barcode* directories", type=str, required=True)
+    arg.add_argument("--manifest", metavar="Path", help="JSON manifest to write, reused for files that did not change", type=str, required=True)
+    arg.add_argument("--cores", metavar="Val", help="Files checked side by side, default all cores", type=int, required=False)
+    return arg.parse_args()
+
+def check_file(path):
+    """Status 'ok', 'empty' or 'corrupt' of a read file with the reads and bases up to the first problem"""
+    reads = bases = 0
+    try:
+        with open_reads([path]) as handle:
+            for _, seq, _ in iter_fastq(handle):
+                reads += 1
+                bases += len(seq)
+    except (RuntimeError, ValueError, OSError) as error:
+        return {'status': 'corrupt', 'reads': reads, 'bases': bases, 'error': str(error)}
+    return {'status': 'ok' if reads else 'empty', 'reads': reads, 'bases': bases, 'error': ''}
+
+def inventory_files(inventory):
+    """Every file of the input inventory, the longread files and the files in the barcode directories"""
+    files = list(inventory['files'])
+    for barcode_info in inventory['barcodes'].values():
+        files.extend(barcode_info['files'])
+    return files
+
+def load_manifest(filename):
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+def preflight(files, manifest_file, cores=None):
+    """Check the files (inventory entries with path, size and mtime) that are not in the manifest with the same size and mtime"""
+    previous = load_manifest(manifest_file)
+    manifest, todo = {}, []
+    for file in files:
+        entry = previous.get(file['path'])
+        if entry and entry['size'] == file['size'] and entry['mtime'] == file['mtime']:
+            manifest[file['path']] = entry
+        elif file['name'].endswith(FASTQ_SUFFIXES):
+            todo.append(file)
+        else: # fasta input is allowed by the samplesheet generator but has no qualities to check
+            manifest[file['path']] = {'size': file['size'], 'mtime': file['mtime'], 'status': 'not_checked', 'reads': None, 'bases': None, 'error': ''}
+    todo.sort(key=lambda file: file['size'], reverse=True)
+    if todo:
+        workers = max(1, min(cores or os.cpu_count() or 1, len(todo)))
+        print(f"Checking {len(todo)} read file(s) ({sum(file['size'] for file in todo) / 1e9:.1f} GB) on {workers} core(s), {len(manifest)} unchanged", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for file, result in zip(todo, pool.map(check_file, [file['path'] for file in todo])):
+                manifest[file['path']] = {'size': file['size'], 'mtime': file['mtime'], **result}
+    tmp = f"{manifest_file}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, manifest_file)
+    return manifest
+
+def main():
+    flags = parse_arguments()
+    inventory = build_inventory(flags.input)
+    manifest = preflight(inventory_files(inventory), flags.manifest, flags.cores)
+    bad = {path: entry for path, entry in manifest.items() if entry['status'] in ('corrupt', 'empty')}
+    for path, entry in sorted(bad.items()):
+        print(f"{entry['status']}: {path} {entry['error']}")
+    print(f"{len(manifest) - len(bad)} of {len(manifest)} file(s) passed, {sum(entry['bases'] or 0 for entry in manifest.values()) / 1e9:.2f} Gb in {sum(entry['reads'] or 0 for entry in manifest.values())} reads")
+    exit(1 if any(entry['status'] == 'corrupt' for entry in bad.values()) else 0)
+
+if __name__ == "__main__":
+    main()
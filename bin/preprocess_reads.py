@@ -0,0 +1,60 @@
+import argparse, sys
+from fastq_io import input_files, open_reads, open_writer, compression_arguments, iter_fastq, iter_batches, mean_qualities, format_record
+
+# Replaces the two 'zcat | chopper' passes of the chopper rule: every input file is decompressed once and each read goes to
+# both the unfiltered set (QC directly on the sequencer output) and the cropped + length/quality filtered set.
+# python /path/to/bin/preprocess_reads.py --input /path/to/barcode01 --irods_mode True --unfiltered unfiltered.fastq.zst --output min1000.fastq.zst --codec zstd --level 3 --threads 4
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--input", metavar="Path", help="Longread file, or directory with fastq files in iRODS mode", type=str, required=True)
+    arg.add_argument("--irods_mode", metavar="Bool", help="True if input is a directory with (chunked) fastq files", type=str, default="False")
+    arg.add_argument("--unfiltered", metavar="Path", help="Output for all reads as they came from the sequencer", type=str, required=True)
+    arg.add_argument("--output", metavar="Path", help="Output for the cropped and filtered reads", type=str, required=True)
+    arg.add_argument("--length", metavar="Val", help="Minimum read length after cropping", type=int, default=1000)
+    arg.add_argument("--quality", metavar="Val", help="Minimum mean read quality after cropping", type=float, default=12)
+    arg.add_argument("--headcrop", metavar="Val", help="Bases to trim from the start of every read", type=int, default=80)
+    arg.add_argument("--tailcrop", metavar="Val", help="Bases to trim from the end of every read", type=int, default=80)
+    arg.add_argument("--threads", metavar="Val", help="Threads of the job, split over the compressors of both outputs", type=int, default=1)
+    compression_arguments(arg) # used for both outputs
+    return arg.parse_args()
+
+def crop_batch(batch, headcrop, tailcrop):
+    """Same as chopper, reads that are not longer than head + tailcrop become empty and are filtered out later"""
+    cropped = []
+    for header, seq, qual in batch:
+        end = len(seq) - tailcrop
+        if end > headcrop:
+            cropped.append((header, seq[headcrop:end], qual[headcrop:end]))
+        else:
+            cropped.append((header, b'', b''))
+    return cropped
+
+def preprocess(paths, unfiltered_path, output_path, length, quality, headcrop, tailcrop, threads, codec=None, level=None):
+    total = kept = 0
+    writer_threads = max(1, threads // 2) # the two compressors share the threads of the job
+    with open_reads(paths) as reads, open_writer(unfiltered_path, writer_threads, codec, level) as unfiltered, open_writer(output_path, writer_threads, codec, level) as output:
+        for batch in iter_batches(iter_fastq(reads)):
+            total += len(batch)
+            unfiltered.write(b''.join([format_record(*record) for record in batch if record[1]]))
+            cropped = crop_batch(batch, headcrop, tailcrop)
+            read_quals = mean_qualities([record[2] for record in cropped])
+            passed = [format_record(*record) for record, read_qual in zip(cropped, read_quals) if len(record[1]) >= length and read_qual >= quality]
+            kept += len(passed)
+            output.write(b''.join(passed))
+    return total, kept
+
+def main():
+    flags = parse_arguments()
+    paths = input_files(flags.input, flags.irods_mode)
+    if len(paths) == 0: # empty outputs, the gate then skips the assemblers of the sample instead of the run never finishing
+        print(f"No fastq files found for {flags.input}, writing empty read files", file=sys.stderr)
+        for path in (flags.unfiltered, flags.output):
+            with open_writer(path, 1, flags.codec, flags.level):
+                pass
+        return
+    total, kept = preprocess(paths, flags.unfiltered, flags.output, flags.length, flags.quality, flags.headcrop, flags.tailcrop, flags.threads, flags.codec, flags.level)
+    print(f"Read {total} reads from {len(paths)} file(s), kept {kept} after cropping and filtering", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse, os, subprocess, sys
+import numpy as np
+from pathlib import Path
+from fastq_io import open_reads, iter_fastq, iter_batches, mean_qualities
+from step_timer import step
+
+# Calculates the NanoPlot NanoStats fields in a single streaming pass per read file and writes, per output directory,
+# NanoStats.txt (same layout as NanoPlot), {sample}_NanoStats.csv for BioNumerics and min_read_depth.txt.
+# NanoPlot itself is only run when plots are requested.
+# python /path/to/bin/read_stats.py --sample R0131_barcode01_11045503 --genome_size 5000000 --fastq reads.fastq.gz --outdir /path/to/nanoplot/gz_filtlong/R0131_barcode01_11045503
+
+QUALITY_CUTOFFS = [5, 7, 10, 12, 15]
+GENERAL_FIELDS = ['Mean read length', 'Mean read quality', 'Median read length', 'Median read quality',
+                  'Number of reads', 'Read length N50', 'STDEV read length', 'Total bases']
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--sample", metavar="Name", help="Run_Bar_Key of the sample, the part before the first '_' is used as key", type=str, required=True)
+    arg.add_argument("--genome_size", metavar="Val", help="Genome size used for coverage and min_read_depth", type=int, required=True)
+    arg.add_argument("--fastq", metavar="Path", help="Read files, one stats report per file", type=str, nargs='+', required=True)
+    arg.add_argument("--outdir", metavar="Path", help="Output directory per read file, in the same order as --fastq", type=str, nargs='+', required=True)
+    arg.add_argument("--plots", help="Also run NanoPlot for the plots and html report", action="store_true", required=False)
+    arg.add_argument("--steps", metavar="Path", help="Optional JSON lines file for the measurements per step (bin/step_timer.py)", type=str, required=False)
+    return arg.parse_args()
+
+def read_arrays(paths):
+    """Read length and mean read quality of every read as numpy arrays"""
+    lengths, quals = [], []
+    with open_reads(paths) as reads:
+        for batch in iter_batches(iter_fastq(reads), 50000):
+            lengths.append(np.fromiter((len(record[1]) for record in batch), dtype=np.int64, count=len(batch)))
+            quals.append(mean_qualities([record[2] for record in batch]))
+    if len(lengths) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    return np.concatenate(lengths), np.concatenate(quals)
+
+def ave_qual(quals):
+    """Average of read qualities in error probability space, as NanoPlot reports the mean read quality"""
+    if len(quals) == 0:
+        return 0.0
+    return float(-10 * np.log10(np.mean(np.power(10, -quals / 10))))
+
+def n50(lengths):
+    if len(lengths) == 0:
+        return 0
+    ordered = np.sort(lengths)[::-1]
+    return int(ordered[np.searchsorted(np.cumsum(ordered), ordered.sum() / 2)])
+
+def summarise(lengths, quals):
+    """Same fields and ordering as NanoStats.txt"""
+    number = len(lengths)
+    total = int(lengths.sum())
+    stats = {'general': {'Mean read length': float(lengths.mean()) if number else 0.0,
+                         'Mean read quality': ave_qual(quals),
+                         'Median read length': float(np.median(lengths)) if number else 0.0,
+                         'Median read quality': float(np.median(quals)) if number else 0.0,
+                         'Number of reads': float(number),
+                         'Read length N50': float(n50(lengths)),
+                         'STDEV read length': float(lengths.std(ddof=1)) if number > 1 else 0.0,
+                         'Total bases': float(total)}}
+    stats['cutoffs'] = []
+    for cutoff in QUALITY_CUTOFFS:
+        above = quals > cutoff
+        count = int(above.sum())
+        stats['cutoffs'].append((cutoff, count, 100 * count / number if number else 0.0, lengths[above].sum() / 1e6))
+    by_quality = np.argsort(quals, kind='stable')[::-1][:5]
+    by_length = np.argsort(lengths, kind='stable')[::-1][:5]
+    stats['top_quality'] = [(float(quals[i]), int(lengths[i])) for i in by_quality]
+    stats['top_length'] = [(int(lengths[i]), float(quals[i])) for i in by_length]
+    return stats
+
+def calc_min_read_depth(size, total_bases):
+    return min(25, int(int(total_bases) / int(size)))
+
+def stats_to_rows(stats, size):
+    """(Description, Value) rows in the order of the BioNumerics csv"""
+    rows = [(field, f"{stats['general'][field]:.1f}") for field in GENERAL_FIELDS]
+    rows.append(('Coverage', f"{round(int(stats['general']['Total bases']) / int(size), 2)}"))
+    for a, (cutoff, count, percentage, megabases) in enumerate(stats['cutoffs']):
+        if a < len(stats['top_quality']): # NanoPlot writes NA in the top 5 when there are less than 5 reads
+            rows.append((f"Number of reads >Q{cutoff}", f"{count}"))
+            rows.append((f"Top {a + 1} highest mean basecall quality score", f"{stats['top_quality'][a][0]:.1f}"))
+            rows.append((f"Top {a + 1} longest read", f"{stats['top_length'][a][0]}"))
+            rows.append((f"Percentage of reads >Q{cutoff}", f"{percentage:.1f}"))
+            rows.append((f"Top {a + 1} highest mean read length", f"{stats['top_quality'][a][1]}"))
+            rows.append((f"Top {a + 1} highest qscore", f"{stats['top_length'][a][1]:.1f}"))
+        rows.append((f"Megabases >Q{cutoff}", f"{megabases:.1f}"))
+    return rows
+
+def write_nanostats_txt(stats, filename):
+    with open(filename, 'w') as stats_file:
+        stats_file.write("General summary:\n")
+        for field in GENERAL_FIELDS:
+            stats_file.write(f"{field}:\t{stats['general'][field]:,.1f}\n")
+        stats_file.write("Number, percentage and megabases of reads above quality cutoffs\n")
+        for cutoff, count, percentage, megabases in stats['cutoffs']:
+            stats_file.write(f">Q{cutoff}:\t{count} ({percentage:.1f}%) {megabases:.1f}Mb\n")
+        stats_file.write("Top 5 highest mean basecall quality scores and their read lengths\n")
+        for a in range(5):
+            stats_file.write(f"{a + 1}:\t{stats['top_quality'][a][0]:.1f} ({stats['top_quality'][a][1]})\n" if a < len(stats['top_quality']) else f"{a + 1}:\tNA\n")
+        stats_file.write("Top 5 longest reads and their mean basecall quality score\n")
+        for a in range(5):
+            stats_file.write(f"{a + 1}:\t{stats['top_length'][a][0]} ({stats['top_length'][a][1]:.1f})\n" if a < len(stats['top_length']) else f"{a + 1}:\tNA\n")
+
+def write_csv(rows, keyname, sample, filename):
+    with open(filename, 'w') as csv_file:
+        csv_file.write("Key,Description,Value,Run_Bar_Key\n")
+        for description, value in rows:
+            csv_file.write(f"{keyname},{description},{value},{sample}\n")
+
+def write_reports(stats, sample, size, outdir):
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    keyname = sample.split('_')[0] # changed to 0 for non irods version
+    write_nanostats_txt(stats, f"{outdir}/NanoStats.txt")
+    write_csv(stats_to_rows(stats, size), keyname, sample, f"{outdir}/{sample}_NanoStats.csv")
+    with open(f"{outdir}/min_read_depth.txt", 'w') as read_infile:
+        read_infile.write(str(calc_min_read_depth(size, stats['general']['Total bases'])))
+
+def main():
+    flags = parse_arguments()
+    if len(flags.fastq) != len(flags.outdir):
+        print("Supply one --outdir for every --fastq file", file=sys.stderr)
+        exit(1)
+    for fastq, outdir in zip(flags.fastq, flags.outdir):
+        read_set = os.path.basename(os.path.dirname(os.path.abspath(outdir)))
+        if flags.plots:
+            with step(flags.steps, f"nanoplot_{read_set}"):
+                subprocess.run(['NanoPlot', '--fastq', fastq, '-o', outdir], check=True)
+        with step(flags.steps, f"stats_{read_set}"):
+            stats = summarise(*read_arrays([fastq]))
+            write_reports(stats, flags.sample, flags.genome_size, os.path.abspath(outdir))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os, json, argparse
+import numpy as np
+from benchmarks import collect_benchmarks, resource_key, tool_read_bases
+
+# Fits memory (max_rss) and runtime per tool on the benchmark files of previous runs as a linear function of the read bases that
+# go into the tool (capped at target_depth x genome_size for the assemblers and medaka) and the genome size. The samplesheet generator uses the model to write predicted mem_mb/runtime_min per
+# sample, the Snakefile reads these through get_resource() and raises them on every retry (attempt).
+# python /path/to/bin/resource_model.py --history /path/to/run1 /path/to/run2 --output resource_model.json
+
+MIN_MEASUREMENTS = 5 # fewer measurements than this for a tool and the static values of the parameter config are used
+SAFETY = 1.2 # on top of the largest underestimate seen in the history
+MIN_MEM_MB = 1000
+MIN_RUNTIME_MIN = 10
+
+def features(read_bases, genome_size):
+    return [1.0, read_bases / 1e9, genome_size / 1e6]
+
+def fit_linear(X, y):
+    """Least squares coefficients and the largest underestimate of the fit, so a prediction covers every run seen so far"""
+    coefficients = np.linalg.lstsq(X, y, rcond=None)[0]
+    margin = float(max(0.0, np.max(y - X @ coefficients)))
+    return [float(c) for c in coefficients], margin
+
+def bases_per_input_byte(rows):
+    """Median ratio between the read bases that reach the assemblers and the size of the raw input files"""
+    ratios = {(row['outdir'], row['sample']): row['read_bases'] / row['input_bytes'] for row in rows if row['read_bases'] and row['input_bytes']}
+    return float(np.median(list(ratios.values()))) if ratios else None
+
+def fit_model(history_dirs):
+    rows = []
+    for outdir in history_dirs:
+        rows.extend(collect_benchmarks(outdir))
+    model = {'tools': {}, 'bases_per_input_byte': bases_per_input_byte(rows), 'history': [os.path.abspath(outdir) for outdir in history_dirs]}
+    tools = sorted(set(resource_key(row['tool']) for row in rows))
+    for tool in tools:
+        usable = [row for row in rows if resource_key(row['tool']) == tool and row['read_bases'] and row['genome_size'] and row['max_rss'] is not None and row['s'] is not None]
+        if len(usable) < MIN_MEASUREMENTS:
+            continue
+        X = np.array([features(tool_read_bases(row['tool'], row['read_bases'], row['genome_size'], row['target_depth']), row['genome_size']) for row in usable])
+        mem_coefficients, mem_margin = fit_linear(X, np.array([row['max_rss'] for row in usable]))
+        runtime_coefficients, runtime_margin = fit_linear(X, np.array([row['s'] / 60 for row in usable]))
+        model['tools'][tool] = {'n': len(usable),
+                                'mem_mb': mem_coefficients, 'mem_margin': mem_margin,
+                                'runtime_min': runtime_coefficients, 'runtime_margin': runtime_margin}
+    return model
+
+def predict(model, read_bases, genome_size, target_depth=0):
+    """{tool: {'mem_mb', 'runtime_min'}} for a sample, empty when there is no model or input estimate"""
+    predictions = {}
+    if not read_bases:
+        return predictions
+    for tool, fitted in model['tools'].items():
+        x = np.array(features(tool_read_bases(tool, read_bases, genome_size, target_depth), genome_size))
+        mem_mb = (x @ np.array(fitted['mem_mb']) + fitted['mem_margin']) * SAFETY
+        runtime_min = (x @ np.array(fitted['runtime_min']) + fitted['runtime_margin']) * SAFETY
+        predictions[tool] = {'mem_mb': int(max(MIN_MEM_MB, np.ceil(mem_mb))), 'runtime_min': int(max(MIN_RUNTIME_MIN, np.ceil(runtime_min)))}
+    return predictions
+
+def estimate_read_bases(model, input_bytes):
+    if not model.get('bases_per_input_byte') or not input_bytes:
+        return None
+    return input_bytes * model['bases_per_input_byte']
+
+def save_model(model, filename):
+    with open(filename, 'w') as f:
+        json.dump(model, f, indent=2)
+
+def main():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--history", metavar="Path", help="Output directories of previous runs", type=str, nargs='+', required=True)
+    arg.add_argument("--output", metavar="Path", help="Where to write the fitted model (json)", type=str, required=True)
+    flags = arg.parse_args()
+    model = fit_model(flags.history)
+    save_model(model, flags.output)
+    for tool, fitted in model['tools'].items():
+        print(f"{tool}: fitted on {fitted['n']} benchmarks")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os, json, hashlib
+
+# Incremental updates of the config files for bin/generate_longread_samplesheet.py --incremental. Every sample gets a hash of its
+# samplesheet entry, its input files (name, size and mtime from the input inventory) and the parameter config, stored in
+# config/samplesheet_hashes.json. A rerun merges new samples into the existing samplesheet, reports which samples are new, changed,
+# unchanged or only in the existing samplesheet (kept), and files are only written when their content changes, so Snakemake sees
+# the same files and parameters for the samples that did not change.
+
+def content_hash(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+def input_signature(inventory, path):
+    """(name, size, mtime) of the input files of a sample: the file itself or the files in its barcode directory"""
+    path = os.path.abspath(path)
+    for info in inventory['barcodes'].values():
+        if os.path.abspath(info['path']) == path:
+            return [(f['name'], f['size'], f['mtime']) for f in info['files']]
+    return [(f['name'], f['size'], f['mtime']) for f in inventory['files'] if os.path.abspath(f['path']) == path]
+
+def sample_hashes(samples, inventory, parameters):
+    parameter_hash = content_hash(parameters)
+    return {sample: content_hash([entry, input_signature(inventory, entry['nanopore_input']), parameter_hash]) for sample, entry in samples.items()}
+
+def merge_samplesheet(existing, generated):
+    """The generated samplesheet with the samples of the existing one that were not generated again"""
+    merged = dict(generated)
+    merged['samples'] = dict(existing.get('samples', {}))
+    merged['samples'].update(generated['samples'])
+    return merged
+
+def classify(old_hashes, new_hashes, samples):
+    """{'new': [...], 'changed': [...], 'unchanged': [...], 'kept': [...]}, kept samples are not in new_hashes"""
+    delta = {'new': [], 'changed': [], 'unchanged': [], 'kept': []}
+    for sample in samples:
+        if sample not in new_hashes:
+            delta['kept'].append(sample)
+        elif sample not in old_hashes:
+            delta['new'].append(sample)
+        elif old_hashes[sample] != new_hashes[sample]:
+            delta['changed'].append(sample)
+        else:
+            delta['unchanged'].append(sample)
+    return delta
+
+def load_hashes(filename):
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+def write_if_changed(filename, text):
+    """Write text to filename unless it already has exactly this content, returns True when the file was written"""
+    if os.path.isfile(filename):
+        with open(filename) as f:
+            if f.read() == text:
+                return False
+    tmp = f"{filename}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, filename)
+    return True
@@ -0,0 +1,81 @@
+import os, json, hashlib
+
+# Genome size lookup on files/species_size.txt, shared by bin/generate_longread_samplesheet.py and bin/edit_nanoplot_longread.py.
+# The full name and genus tables are built once and cached next to species_size.txt, the cache is rebuilt when the
+# modification time and the content hash of species_size.txt no longer match. Names are looked up exactly as they always were first,
+# the lower case and single space versions are only a fallback, so no existing lookup changes.
+
+DEFAULT_SIZE = 5000000
+INDEX_VERSION = 2 # caches of another version are rebuilt
+
+def normalise(name):
+    """Lower case and single spaces so 'Escherichia  coli' and 'escherichia coli' are the same species"""
+    return ' '.join(str(name).split()).lower()
+
+def determine_single(fullname_dict):
+    """Average genome size per genus, calculated the same (integer running average) way as it always was"""
+    func_single_name_dict = {}
+    func_single_name_count_dict = {}
+    for v in fullname_dict:
+        single = v.split(' ')[0]
+        genomesize = fullname_dict[v]
+        if single in func_single_name_dict:
+            func_single_name_dict[single] = int((((func_single_name_dict[single] * func_single_name_count_dict[single]) + genomesize) / (func_single_name_count_dict[single]+1)))
+            func_single_name_count_dict[single] += 1
+        else:
+            func_single_name_dict[single] = genomesize
+            func_single_name_count_dict[single] = 1
+    return func_single_name_dict
+
+def build_index(fullname_dict):
+    full = {normalise(name): size for name, size in fullname_dict.items()} # a name that is in species_size.txt twice in another case keeps the last one
+    return {'exact': dict(fullname_dict), 'genus_exact': determine_single(fullname_dict), 'full': full, 'genus': determine_single(full)}
+
+def file_hash(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def cache_path(species_file):
+    return f"{os.path.splitext(species_file)[0]}.index.json"
+
+def load_species_index(species_file):
+    """Index with the 'full' and 'genus' tables, from the cache when species_size.txt did not change"""
+    species_file = os.path.abspath(species_file)
+    index_file = cache_path(species_file)
+    mtime = os.stat(species_file).st_mtime_ns
+    cached = None
+    if os.path.isfile(index_file):
+        try:
+            with open(index_file) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = None
+    if cached and cached.get('version') != INDEX_VERSION:
+        cached = None
+    if cached and cached.get('mtime') == mtime:
+        return cached['index']
+    digest = file_hash(species_file)
+    if cached and cached.get('sha256') == digest:
+        index = cached['index']
+    else:
+        with open(species_file) as f:
+            index = build_index(json.load(f))
+    try: # Not being able to write the cache (read only snakemake dir for example) is not a problem
+        with open(f"{index_file}.tmp", 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'mtime': mtime, 'sha256': digest, 'index': index}, f)
+        os.replace(f"{index_file}.tmp", index_file)
+    except OSError:
+        pass
+    return index
+
+def get_size(species_name, index):
+    """Genome size of the species, else the average of its genus, else the default of 5Mb"""
+    species_name = str(species_name)
+    if species_name in index['exact']:
+        return index['exact'][species_name]
+    name = normalise(species_name)
+    if name in index['full']:
+        return index['full'][name]
+    if species_name.split(' ')[0] in index['genus_exact']:
+        return index['genus_exact'][species_name.split(' ')[0]]
+    return index['genus'].get(name.split(' ')[0], DEFAULT_SIZE)
@@ -0,0 +1,148 @@
+import os, sys, json, time, resource, argparse, subprocess, threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# Per step measurements inside a rule, the benchmark: directive of Snakemake only measures the rule as a whole.
+# Every step appends a JSON line to a file under {OUT}/log/steps/ with the same relative path as the benchmark file of the rule
+# (log/benchmark/medaka/medaka_flye_{sample}.txt -> log/steps/medaka/medaka_flye_{sample}.jsonl) and the same units as the
+# benchmark columns: s, cpu_time (seconds), max_rss, io_in, io_out (MB).
+# CPU time comes from the rusage of the step, peak RSS and I/O from sampling /proc of the whole process tree of the step, so
+# processes that live shorter than the interval can be missed for these.
+# A command:       python /path/to/bin/step_timer.py --output log/steps/medaka/medaka_flye_S1.jsonl --step round1 -- medaka_consensus ...
+# Python code:     with step_timer.step(output, 'gz_filtlong'): ...
+
+INTERVAL = 0.5 # seconds between samples of /proc
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--output", metavar="Path", help="JSON lines file to append the measurement to", type=str, required=True)
+    arg.add_argument("--step", metavar="Name", help="Name of the step", type=str, required=True)
+    arg.add_argument("command", metavar="Command", help="Command to run, after --", type=str, nargs=argparse.REMAINDER)
+    return arg.parse_args()
+
+def read_proc(pid, name):
+    try:
+        with open(f"/proc/{pid}/{name}") as f:
+            return f.read()
+    except OSError: # the process ended or /proc is not readable
+        return ''
+
+def children(pid):
+    """All descendants of pid"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            stat = read_proc(entry, 'stat')
+            if stat:
+                parents.setdefault(int(stat.rsplit(')', 1)[1].split()[1]), []).append(int(entry))
+    found, todo = [], [pid]
+    while todo:
+        for child in parents.get(todo.pop(), []):
+            found.append(child)
+            todo.append(child)
+    return found
+
+def rss_mb(pid):
+    for line in read_proc(pid, 'status').splitlines():
+        if line.startswith('VmRSS:'):
+            return int(line.split()[1]) / 1024
+    return 0.0
+
+def io_bytes(pid):
+    """(read_bytes, write_bytes) of the process, what actually went to or came from storage"""
+    values = dict(line.split(': ') for line in read_proc(pid, 'io').splitlines() if ': ' in line)
+    return int(values.get('read_bytes', 0)), int(values.get('write_bytes', 0))
+
+class TreeSampler:
+    def __init__(self, pid):
+        self.pid = pid
+        self.max_rss = 0.0
+        self.io = {} # last seen (read_bytes, write_bytes) per pid, ended processes keep their last values
+
+    def sample(self):
+        pids = [self.pid] + children(self.pid)
+        self.max_rss = max(self.max_rss, sum(rss_mb(pid) for pid in pids))
+        for pid in pids:
+            values = io_bytes(pid)
+            if values != (0, 0):
+                self.io[pid] = values
+
+    def io_mb(self, baseline=(0, 0)):
+        return tuple((sum(values[i] for values in self.io.values()) - baseline[i]) / 1024 ** 2 for i in range(2))
+
+def write_measurement(output, measurement):
+    Path(os.path.dirname(os.path.abspath(output))).mkdir(parents=True, exist_ok=True)
+    with open(output, 'a') as f: # a single short write, lines of steps that run side by side don't get mixed
+        f.write(json.dumps(measurement) + '\n')
+
+def exit_code(status):
+    """Wait status as a returncode like subprocess gives, -signal when killed (os.waitstatus_to_exitcode needs Python 3.9)"""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+def run_command(output, step_name, command, stderr=None):
+    """Run the command as a step and return its exit code. The rusage comes from reaping the process itself, so steps that
+    run side by side in one Python process (bin/medaka_batch.py) don't get each other's CPU time"""
+    start = time.time()
+    process = subprocess.Popen(command, stderr=stderr)
+    sampler = TreeSampler(process.pid)
+    reaped = {}
+    def reap():
+        _, reaped['status'], reaped['usage'] = os.wait4(process.pid, 0)
+    waiter = threading.Thread(target=reap, daemon=True)
+    waiter.start()
+    while waiter.is_alive():
+        sampler.sample()
+        waiter.join(INTERVAL)
+    process.returncode = exit_code(reaped['status'])
+    usage = reaped['usage']
+    io_in, io_out = sampler.io_mb()
+    write_measurement(output, {'step': step_name, 'command': ' '.join(command), 'start': start, 's': round(time.time() - start, 4),
+                               'cpu_time': round(usage.ru_utime + usage.ru_stime, 2),
+                               'max_rss': round(sampler.max_rss, 2),
+                               'io_in': round(io_in, 2), 'io_out': round(io_out, 2), 'exit_code': process.returncode})
+    return process.returncode
+
+@contextmanager
+def step(output, step_name):
+    """Measure a block of Python code (and the processes it starts) as a step, nothing is measured without an output file"""
+    if not output:
+        yield
+        return
+    start = time.time()
+    self_usage, child_usage = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    sampler = TreeSampler(os.getpid())
+    sampler.sample()
+    baseline = tuple(sum(values[i] for values in sampler.io.values()) for i in range(2))
+    stopped = threading.Event()
+    def sample_loop():
+        while not stopped.wait(INTERVAL):
+            sampler.sample()
+    thread = threading.Thread(target=sample_loop, daemon=True)
+    thread.start()
+    exit_code = 1
+    try:
+        yield
+        exit_code = 0
+    finally:
+        stopped.set()
+        thread.join()
+        sampler.sample()
+        end_self, end_child = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time = sum(end.ru_utime + end.ru_stime - begin.ru_utime - begin.ru_stime for begin, end in [(self_usage, end_self), (child_usage, end_child)])
+        io_in, io_out = sampler.io_mb(baseline)
+        write_measurement(output, {'step': step_name, 'command': ' '.join(sys.argv), 'start': start, 's': round(time.time() - start, 4),
+                                   'cpu_time': round(cpu_time, 2), 'max_rss': round(sampler.max_rss, 2),
+                                   'io_in': round(io_in, 2), 'io_out': round(io_out, 2), 'exit_code': exit_code})
+
+def main():
+    flags = parse_arguments()
+    command = flags.command[1:] if flags.command[:1] == ['--'] else flags.command
+    if not command:
+        print("No command given to run")
+        exit(1)
+    exit(run_command(flags.output, flags.step, command))
+
+if __name__ == "__main__":
+    main()
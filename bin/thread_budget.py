@@ -0,0 +1,57 @@
+import re
+
+# Threads of every tool come from the one threads block in the parameter config: the rules pass {threads} to the tools,
+# bin/necat_generate_cfg.py writes it as THREADS and canu gets it as maxThreads. A tool that starts more threads than Snakemake
+# reserved for it oversubscribes the node and makes the benchmarks useless, validate_snakefile() catches that when the
+# samplesheet is generated. --total_cores scales all values to the cores of the machine or cluster node.
+
+DEFAULT_THREADS = {'default': 1,
+                   'canu': 4,
+                   'chopper': 4,
+                   'downsample': 4,
+                   'filtlong': 4,
+                   'flye': 4,
+                   'kraken2': 4,
+                   'medaka': 8,
+                   'miniasm_polish': 4,
+                   'necat': 4,
+                   'pycoqc': 1,
+                   'raven': 4,
+                   'redbean': 2,
+                   'longcycler': 8}
+REFERENCE_CORES = 8 # the defaults above are meant for nodes with this many cores
+SINGLE_THREADED = ['default', 'pycoqc'] # not scaled
+
+RULE_PATTERN = re.compile(r'^(?:rule|checkpoint) (\w+):\n(.*?)(?=^(?:rule|checkpoint) |\Z)', re.S | re.M)
+THREADS_PATTERN = re.compile(r'^\s+threads:\s*(?:config\["threads"\]\["(\w+)"\]|(\d+))', re.M)
+SHELL_PATTERN = re.compile(r'^\s+shell:.*?"""(.*?)"""', re.S | re.M)
+# Thread counts written out in a shell command instead of {threads}
+LITERAL_PATTERN = re.compile(r'(?<![\w-])(?:-t|--threads|--cores|-@)\s+\d+|\b(?:maxThreads|THREADS)=\d+')
+
+def scale_threads(threads, total_cores=None):
+    """Scale every tool's threads proportionally to total_cores, no tool gets less than 1 or more than total_cores"""
+    if not total_cores:
+        return dict(threads)
+    factor = total_cores / REFERENCE_CORES
+    return {tool: value if tool in SINGLE_THREADED else min(total_cores, max(1, round(value * factor))) for tool, value in threads.items()}
+
+def validate_snakefile(snakefile, threads, total_cores=None):
+    """Problems with the thread budget of the rules in the Snakefile, an empty list when every rule keeps to its reservation"""
+    with open(snakefile) as f:
+        text = f.read()
+    problems = []
+    for rule, body in RULE_PATTERN.findall(text):
+        reservation = THREADS_PATTERN.search(body)
+        if reservation and reservation.group(1):
+            if reservation.group(1) not in threads:
+                problems.append(f"rule {rule}: no threads configured for '{reservation.group(1)}'")
+                continue
+            reserved = threads[reservation.group(1)]
+        else:
+            reserved = int(reservation.group(2)) if reservation else 1
+        if total_cores and reserved > total_cores:
+            problems.append(f"rule {rule}: reserves {reserved} threads, more than the {total_cores} total cores")
+        shell = SHELL_PATTERN.search(body)
+        for literal in LITERAL_PATTERN.findall(shell.group(1) if shell else ''):
+            problems.append(f"rule {rule}: '{literal}' in the shell command, use {{threads}} ({reserved} reserved)")
+    return problems
@@ -1,9 +1,9 @@
-import os, requests, ssl, re, argparse, time, yaml
+import os, ssl, re, argparse, time, yaml
 from irods.session import iRODSSession
 from irods.models import Collection, DataObjectMeta, DataObject, CollectionMeta
 from irods.column import Criterion
-
-cert='/etc/pki/ca-trust/extracted/pem/tls-ca-bundle.pem'
+from contextlib import contextmanager
+from ngsruns_client import NgsRunsClient
 
 def irodsConnect(irodsfile="", use_ssl=False, **kwargs):
     """Connect to irods iCAT and return iRODSSession object
@@ -40,38 +40,25 @@ except KeyError:
 ssl_settings = {} # Or, optionally: {'ssl_context': <user_customized_SSLContext>}
 # env_file = os.path.expanduser('~/.irods/irods_environment.json')
 
-def rest_call(url):
-    response = requests.get(url, verify=cert)
-    try:
-        return_data = response.json()
-    except:
-        raise Exception("url '{}' gives no json data".format(url))
-    return return_data, response.status_code
+@contextmanager
+def shared_session(session=None):
+    """Use the session of the run when given (see bin/irods_staging.py), otherwise open one just for this call"""
+    if session is not None:
+        yield session
+    else:
+        with iRODSSession(irods_env_file=env_file) as own_session:
+            yield own_session
 
-def ExtractFromjson(nanopore_basename_dir):
-    run_bar_key_list = []
-    list_isolate_key = []
-    server="http://rivm-biofl-l01p.rivm.ssc-campus.nl"
+def ExtractFromjson(nanopore_basename_dir, client=None):
+    # The ngsruns client reuses its HTTP session and caches the answer per flowcell, see bin/ngsruns_client.py
+    if client is None:
+        client = NgsRunsClient()
     FLOWCELLID = nanopore_basename_dir.split('/')[-1].split('_')[3]
-    request = server + "/ngsruns/api/runs/" + FLOWCELLID
-    runinfo, response = rest_call(request)
-    if not runinfo or response != 200:
-        return False
-    run_prefix = runinfo["name"]
-    request = server + "/ngsruns/api/runs/" + FLOWCELLID + "/barcodes"
-    barcodes, response = rest_call(request)
-    if not barcodes or response != 200:
-        return False
-    for item in barcodes:
-        barcode = item["barcode"]
-        key = item["sampleid"]
-        run_bar_key_list.append(f"{run_prefix}_{barcode}_{key}")
-        list_isolate_key.append(key)
-    return list_isolate_key, run_bar_key_list
+    return client.run_bar_keys(FLOWCELLID)
 
-def get_usercfg_h():
+def get_usercfg_h(session=None):
     # with irodsConnect() as session:
-    with iRODSSession(irods_env_file=env_file) as session:
+    with shared_session(session) as session:
         print(f"Searching iRODS1")
         if not session.data_objects.exists(f"/rivmZone/projects/bsr_amr/config/user.yaml"):
             print(f"No access or config file for project bsr_amr - run iinit and try again.")
@@ -83,12 +70,12 @@ def get_usercfg_h():
                 configyml = yaml.safe_load(configread)
                 return configyml
 
-def irods_for_html_report(basedir):
+def irods_for_html_report(basedir, session=None):
     if basedir == 'NO_DIR':
         return 'no_file', False
     else:
         # with irodsConnect() as session:
-        with iRODSSession(irods_env_file=env_file) as session:
+        with shared_session(session) as session:
             print(f"Searching iRODS for html report", end=' ')
             q = session.query(Collection.name, DataObject).filter(
                 Criterion('like', Collection.name, f"/rivmZone/projects/ngslab/minion/{basedir}")).filter(
@@ -103,12 +90,12 @@ def irods_for_html_report(basedir):
                 return filename, irods_path
 
 
-def irods_for_sequence_sum(basedir):
+def irods_for_sequence_sum(basedir, session=None):
     if basedir == 'NO_DIR':
         return 'no_sequencing_summary.html', False
     else:
         # with irodsConnect() as session:
-        with iRODSSession(irods_env_file=env_file) as session:
+        with shared_session(session) as session:
             print(f"Searching iRODS for sequence summary", end=' ')
             q = session.query(Collection.name, CollectionMeta).filter(
                 Criterion('like', Collection.name, f"/rivmZone/projects/ngslab/minion/{basedir}")).filter(
@@ -0,0 +1,66 @@
+import argparse, csv, sys
+import numpy as np
+from contextlib import ExitStack
+from pathlib import Path
+from fastq_io import open_reads, open_writer, iter_fastq, iter_batches, format_record
+
+# Makes all Trycycler read subsets of a sample (sample_01..sample_21, see define_subsets() in the samplesheet generator) while reading
+# the filtlong output once, instead of one subsampling pass per subset. Like trycycler subsample every read ends up in about two subsets,
+# but every subset gets at least min_read_depth (nanoplot/gz_filtlong/{sample}/min_read_depth.txt) times the genome size in bases.
+# Whether a read goes into a subset is drawn per read and subset from a seeded random generator, so the subsets are the same on a rerun.
+# python /path/to/bin/trycycler_subsets.py --input filtlong.fastq.gz --outdir /path/to/gz/trycycler_subsets/sample --subsets sample_01 sample_02 sample_03 --genome_size 5000000 --min_read_depth_file min_read_depth.txt --nanostats sample_NanoStats.csv
+
+def parse_arguments():
+    arg = argparse.ArgumentParser()
+    arg.add_argument("--input", metavar="Path", help="Read file, can be compressed", type=str, required=True)
+    arg.add_argument("--outdir", metavar="Path", help="Directory for the subsets, one {subset}.fastq per subset", type=str, required=True)
+    arg.add_argument("--subsets", metavar="Name", help="Names of the subsets", type=str, nargs='+', required=True)
+    arg.add_argument("--genome_size", metavar="Val", help="Expected genome size of the sample", type=int, required=True)
+    arg.add_argument("--min_read_depth_file", metavar="Path", help="min_read_depth.txt of the filtlong read set", type=str, required=True)
+    arg.add_argument("--nanostats", metavar="Path", help="{sample}_NanoStats.csv of the filtlong read set, for the total bases", type=str, required=True)
+    arg.add_argument("--seed", metavar="Val", help="Seed of the random generator, default 0", type=int, default=0)
+    return arg.parse_args()
+
+def read_total_bases(filename):
+    with open(filename) as f:
+        for row in csv.DictReader(f):
+            if row['Description'] == 'Total bases':
+                return float(row['Value'])
+    return None
+
+def subset_fraction(count, total_bases, genome_size, min_read_depth):
+    """Share of the reads that goes into every subset"""
+    fraction = 2 / count
+    if total_bases:
+        fraction = max(fraction, min_read_depth * genome_size / total_bases)
+    return min(1.0, fraction)
+
+def write_subsets(path, outputs, fraction, seed, batch_size=10000):
+    """Single pass over the reads, returns the number of reads written to every output"""
+    rng = np.random.default_rng(seed)
+    counts = np.zeros(len(outputs), dtype=np.int64)
+    with ExitStack() as stack, open_reads([path]) as reads:
+        handles = [stack.enter_context(open_writer(output)) for output in outputs]
+        for batch in iter_batches(iter_fastq(reads), batch_size):
+            chosen = rng.random((len(batch), len(outputs))) < fraction
+            counts += chosen.sum(axis=0)
+            for record, row in zip(batch, chosen):
+                if row.any():
+                    text = format_record(*record)
+                    for i in np.flatnonzero(row):
+                        handles[i].write(text)
+    return counts
+
+def main():
+    flags = parse_arguments()
+    with open(flags.min_read_depth_file) as f:
+        min_read_depth = int(f.read().strip())
+    fraction = subset_fraction(len(flags.subsets), read_total_bases(flags.nanostats), flags.genome_size, min_read_depth)
+    Path(flags.outdir).mkdir(parents=True, exist_ok=True)
+    outputs = [f"{flags.outdir}/{subset}.fastq" for subset in flags.subsets]
+    counts = write_subsets(flags.input, outputs, fraction, flags.seed)
+    for subset, count in zip(flags.subsets, counts):
+        print(f"{subset}: {count} reads ({fraction:.1%} of the reads)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
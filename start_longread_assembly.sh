@@ -17,9 +17,23 @@ DATAPATH_CMD=""
 INPUT_CMD=""
 OUTPUT_CMD=""
 KEEP_PERCENT_CMD=""
+TARGET_DEPTH_CMD=""
+TOTAL_CORES_CMD=""
+NO_SIZE_ESTIMATE_CMD=""
+MIN_COVERAGE_CMD=""
+MIN_READ_N50_CMD=""
+COMPRESSION_CMD=""
+SCRATCH_DIR_CMD=""
 MEDAKA_ROUNDS=""
 MEDAKA_ROUNDS_CMD=""
 ALLASS_CMD=""
+TRYCYCLER_CMD=""
+GROUP_JOBS_CMD=""
+MEDAKA_BATCH_CMD=""
+RESOURCE_HISTORY_CMD=""
+INCREMENTAL_CMD=""
+PREFLIGHT_CMD=""
+KEEP_BAD_INPUTS_CMD=""
 MEDAKA_MODEL='r1041_e82_400bps_sup_v4.3.0'
 # MEDAKA_MODELS='r1041_e82_400bps_sup_v4.3.0','r1041_e82_400bps_hac_g632','r1041_e82_260bps_hac_g632','r1041_e82_260bps_sup_g632','r1041_e82_400bps_sup_g615','r941_min_hac_g507'
 MEDAKA_MODEL_CMD="--medaka_model ${MEDAKA_MODEL}"
@@ -48,10 +62,24 @@ function usage(){
 	printf "\t-l, --longread		        : Another input option, expects a directory with single file per isolate. Can be used when not using iRODS mode\n"
 	printf "\t-n, --nanopore_dir		    : Can supply to overwrite basedir when using alt_input to use this collection name in iRODS (Can not be used outside RIVM)\n"
 	printf "\t-k, --keep_percent	        : Keep percentage for filtering on quality with filtlong, default is 90, must be less than 100 (Optional)\n"
+	printf "\t-td, --target_depth		: Depth the filtered reads are downsampled to before assembly and polishing, default is 100, 0 uses all reads (Optional)\n"
 	printf "\t-m, --medaka			: Supply to run medaka, default 1 round of polishing (Optional)\n"
     printf "\t-mr, --medaka_rounds		: Number of medaka rounds for polishing in case of supplying medaka flag, default 1 (Optional)\n"
+	printf "\t-mb, --medaka_batch		: Polish all assemblies of a sample in a single medaka job (Optional)\n"
 	printf "\t-aa, --all_assemblers	: Supply to run all 7 assemblers, otherwise will run only those specified in files/assembler_choice.csv with yes or no (Optional)\n"
+	printf "\t-tr, --trycycler		: Supply to also make the Trycycler read subsets (gz/trycycler_subsets) of every isolate (Optional)\n"
+	printf "\t-gj, --group_jobs		: Supply to submit the preprocessing of an isolate (chopper, filtlong, nanoplot, downsampling) as one cluster job (Optional)\n"
 	printf "\t-if, --isolates			: Optional for non iRODS mode only, .txt file with isolate keynames, will otherwise try to guess from the first underscore index on longread data name (Optional)\n"
+	printf "\t-tc, --total_cores		: Cores of the machine or cluster node, the threads of every tool are scaled to it (default values are meant for 8 cores) (Optional)\n"
+	printf "\t-ns, --no_size_estimate	: Use the genome size of files/species_size.txt instead of estimating it from the reads (Optional)\n"
+	printf "\t-mc, --min_coverage		: Samples with a lower coverage after filtering are not assembled (default 10, canu and NECAT at least 20) (Optional)\n"
+	printf "\t-mn, --min_read_n50		: Samples with a lower read N50 after filtering are not assembled (default 1000) (Optional)\n"
+	printf "\t-cz, --compression		: Codec of the intermediate read files: gzip, pigz, bgzip, zstd or none (default pigz) (Optional)\n"
+	printf "\t-sd, --scratch_dir		: Directory for the intermediate read files, e.g. a fast scratch disk together with -cz none, must be shared by all nodes (Optional)\n"
+	printf "\t-inc, --incremental		: Add new samples to the existing samplesheet of the output directory, config files are only rewritten when they change (Optional)\n"
+	printf "\t-pf, --preflight		: Check every input read file for truncated or corrupt data before the samplesheet is made, samples with a corrupt file are left out (Optional)\n"
+	printf "\t-kb, --keep_bad_inputs		: With --preflight, keep the samples with a corrupt file and flag them in the samplesheet (Optional)\n"
+	printf "\t-rh, --resource_history	: Output directories of previous runs (quoted and space separated), their benchmarks are used to predict memory and runtime per sample (Optional)\n"
 	printf "\t-u, --unlock			: Unlock the Snakemake directory\n"
     printf "\t-ts, --testrun			: Command for test run. Will create samplesheet and environment then run following command and then exit: snakemake -np \n\n"
 }
@@ -98,9 +126,21 @@ do
         KEEP_PERCENT="$2";
         shift 1
         ;; 
+    -td|--target_depth) 
+        if [[ "$2" =~ ^[0-9]+$ ]]; then
+            TARGET_DEPTH_CMD="--target_depth $2";
+        shift 1
+        else
+            echo "Invalid number for -td|--target_depth: $2"
+            exit 1
+        fi
+        ;; 
     -m|--medaka) 
         MEDAKA="True";
         ;;  
+    -mb|--medaka_batch) 
+        MEDAKA_BATCH_CMD="--medaka_batch";
+        ;; 
     -mr|--medaka_rounds) 
         if [[ "$2" =~ ^[1-9][0-9]*$ ]]; then
             MEDAKA_ROUNDS="$2";
@@ -113,6 +153,68 @@ do
     -aa|--all_assemblers) 
         ALLASS_CMD="--all_assemblers";
         ;; 
+    -tc|--total_cores) 
+        if [[ "$2" =~ ^[1-9][0-9]*$ ]]; then
+            TOTAL_CORES_CMD="--total_cores $2";
+        shift 1
+        else
+            echo "Invalid number for -tc|--total_cores: $2"
+            exit 1
+        fi
+        ;; 
+    -ns|--no_size_estimate) 
+        NO_SIZE_ESTIMATE_CMD="--no_genome_size_estimate";
+        ;; 
+    -mc|--min_coverage) 
+        if [[ "$2" =~ ^[0-9]+([.][0-9]+)?$ ]]; then
+            MIN_COVERAGE_CMD="--min_coverage $2";
+        shift 1
+        else
+            echo "Invalid number for -mc|--min_coverage: $2"
+            exit 1
+        fi
+        ;; 
+    -mn|--min_read_n50) 
+        if [[ "$2" =~ ^[0-9]+$ ]]; then
+            MIN_READ_N50_CMD="--min_read_n50 $2";
+        shift 1
+        else
+            echo "Invalid number for -mn|--min_read_n50: $2"
+            exit 1
+        fi
+        ;; 
+    -cz|--compression) 
+        if [[ "$2" =~ ^(gzip|pigz|bgzip|zstd|none)$ ]]; then
+            COMPRESSION_CMD="--compression $2";
+        shift 1
+        else
+            echo "Invalid codec for -cz|--compression: $2"
+            exit 1
+        fi
+        ;; 
+    -sd|--scratch_dir) 
+        SCRATCH_DIR_CMD="--scratch_dir $2";
+        shift 1
+        ;; 
+    -inc|--incremental) 
+        INCREMENTAL_CMD="--incremental";
+        ;; 
+    -pf|--preflight) 
+        PREFLIGHT_CMD="--preflight";
+        ;; 
+    -kb|--keep_bad_inputs) 
+        KEEP_BAD_INPUTS_CMD="--keep_bad_inputs";
+        ;; 
+    -rh|--resource_history) 
+        RESOURCE_HISTORY_CMD="--resource_history $2";
+        shift 1
+        ;; 
+    -tr|--trycycler) 
+        TRYCYCLER_CMD="--trycycler";
+        ;; 
+    -gj|--group_jobs) 
+        GROUP_JOBS_CMD="--group_jobs";
+        ;; 
     -if|--isolates) 
         ISOLATES="$2";
         ;;   
@@ -314,8 +416,8 @@ conda config --env --set channel_priority strict
 ######################################################################
 
 echo "Generating the sample sheet with the following command:"
-echo "python bin/generate_longread_samplesheet.py ${WORKDIR_CMD} ${NANOPORE_CMD} ${DATAPATH_CMD} ${KEEP_PERCENT_CMD} ${ALLASS_CMD} ${MEDAKA_CMD} ${MEDAKA_ROUNDS_CMD} ${INPUT_CMD} ${OUTPUT_CMD} ${MEDAKA_MODEL_CMD} ${BASECALLED_DIR_CMD}"
-python bin/generate_longread_samplesheet.py ${WORKDIR_CMD} ${NANOPORE_CMD} ${DATAPATH_CMD} ${KEEP_PERCENT_CMD} ${ALLASS_CMD} ${MEDAKA_CMD} ${MEDAKA_ROUNDS_CMD} ${INPUT_CMD} ${OUTPUT_CMD} ${MEDAKA_MODEL_CMD} ${BASECALLED_DIR_CMD}
+echo "python bin/generate_longread_samplesheet.py ${WORKDIR_CMD} ${NANOPORE_CMD} ${DATAPATH_CMD} ${KEEP_PERCENT_CMD} ${TARGET_DEPTH_CMD} ${ALLASS_CMD} ${TRYCYCLER_CMD} ${GROUP_JOBS_CMD} ${MEDAKA_CMD} ${MEDAKA_ROUNDS_CMD} ${MEDAKA_BATCH_CMD} ${INPUT_CMD} ${OUTPUT_CMD} ${MEDAKA_MODEL_CMD} ${BASECALLED_DIR_CMD} ${TOTAL_CORES_CMD} ${NO_SIZE_ESTIMATE_CMD} ${MIN_COVERAGE_CMD} ${MIN_READ_N50_CMD} ${COMPRESSION_CMD} ${SCRATCH_DIR_CMD} ${RESOURCE_HISTORY_CMD} ${INCREMENTAL_CMD} ${PREFLIGHT_CMD} ${KEEP_BAD_INPUTS_CMD}"
+python bin/generate_longread_samplesheet.py ${WORKDIR_CMD} ${NANOPORE_CMD} ${DATAPATH_CMD} ${KEEP_PERCENT_CMD} ${TARGET_DEPTH_CMD} ${ALLASS_CMD} ${TRYCYCLER_CMD} ${GROUP_JOBS_CMD} ${MEDAKA_CMD} ${MEDAKA_ROUNDS_CMD} ${MEDAKA_BATCH_CMD} ${INPUT_CMD} ${OUTPUT_CMD} ${MEDAKA_MODEL_CMD} ${BASECALLED_DIR_CMD} ${TOTAL_CORES_CMD} ${NO_SIZE_ESTIMATE_CMD} ${MIN_COVERAGE_CMD} ${MIN_READ_N50_CMD} ${COMPRESSION_CMD} ${SCRATCH_DIR_CMD} ${RESOURCE_HISTORY_CMD} ${INCREMENTAL_CMD} ${PREFLIGHT_CMD} ${KEEP_BAD_INPUTS_CMD}
 
 SAMPLESHEET="${OUTPUT_DIR}/config/longread_samplesheet.yaml"
 PARAMETER_CONFIG="${OUTPUT_DIR}/config/longread_parameter_config.yaml"